@@ -1,173 +1,23 @@
 import pandas as pd
 import numpy as np
-import random 
-
-feature_ranges  = {
-     "summer" : {
-            "irradiance" : (600,1000),
-            "humidity" : (10,50),
-            "wind_speed" : (0,5),
-            "ambient_temperature" : (10,40),
-            'tilt_angle': (10, 40)
-
-    },
-
-    "winter" : {
-        'irradiance': (300, 700),
-        'humidity': (30, 70),
-        'wind_speed': (1, 6),
-        'ambient_temperature': (5, 20),
-        'tilt_angle': (10, 40)
-    },
-
-    'monsoon': {
-        'irradiance': (100, 600),
-        'humidity': (70, 100),
-        'wind_speed': (2, 8),
-        'ambient_temperature': (20, 35),
-        'tilt_angle': (10, 40),
-    }   
-
-}
-
-summer_months_day = {
-    'March' : 31,
-    'April' : 30,
-    'May' : 31,
-    'June' : 30
-}
-
-winter_months_day = {
-    'November': 30,
-    'December': 31,
-    'January': 31,
-    'February': 28  
-}
-
-monsoon_months_days = {
-    'July': 31,
-    'August': 31,
-    'September': 30,
-    'October': 31
-}
-
-
-
-def cal_kwh_summer(irr,hum,ws,at,tilt):
-    return (0.25 * irr
-            - 0.05 * hum
-            + 0.02 * ws
-            + 0.1 * at
-            - 0.03 * abs(tilt - 30))
-
-def generate_summer_data_by_month(feature_ranges,months_day):
-    data = []
-    for month,days in months_day.items():
-        for _ in range(days):
-            irr = np.random.uniform(*feature_ranges["summer"]["irradiance"])
-            hum = np.random.uniform(*feature_ranges["summer"]["humidity"])
-            wind = np.random.uniform(*feature_ranges["summer"]["wind_speed"])
-            temp = np.random.uniform(*feature_ranges["summer"]["ambient_temperature"])
-            tilt = np.random.uniform(*feature_ranges['summer']['tilt_angle'])
-
-            kwh = cal_kwh_summer(irr,hum,wind,temp,tilt) 
-
-            data.append({
-                    'irradiance': round(irr, 2),
-                    'humidity': round(hum, 2),
-                    'wind_speed': round(wind, 2),
-                    'ambient_temperature': round(temp, 2),
-                    'tilt_angle': round(tilt, 2),
-                    'kwh': round(kwh, 2),
-                    'season': 'summer',
-                    'month': month
-                })
-    return pd.DataFrame(data)
-        
-
-
-
-
-
-
-def cal_kwh_winter(irr,hum,win,temp,ang):
-    return ( 0.25 * irr - 0.025*hum + 0.02*win + 0.1*temp - 0.03 * abs(ang-30)) 
-
-
-def ganerate_winter_data_bt_month(feature_range,months_day):
-    data = []
-    for month,day in months_day.items():
-        for _ in range(day):
-            irr = np.random.uniform(*feature_range["winter"]["irradiance"])
-            hum = np.random.uniform(*feature_range["winter"]["humidity"])
-            win = np.random.uniform(*feature_range["winter"]["wind_speed"])
-            temp = np.random.uniform(*feature_range["winter"]["ambient_temperature"])
-            ang = np.random.uniform(*feature_range["winter"]["tilt_angle"])
-
-            kwh = cal_kwh_winter(irr,hum,win,temp,ang)
-
-            data.append({
-                'irradiance' : round(irr,2),
-                'humidity' : round(hum,2),
-                'wind_speed' : round(win,2),
-                'ambient_temperature' : round(temp,2),
-                'tilt_angle' :round(ang,2),
-                'kwh' : round(kwh,2),
-                'season' : 'winter',
-                'month' : month
-
-
-            })
-    return pd.DataFrame(data)
-
-
-    
-
-def calc_kwh_monsoon(irradiance, humidity, wind_speed, ambient_temp, tilt_angle):
-    return (0.15 * irradiance
-            - 0.1 * humidity
-            + 0.01 * wind_speed
-            + 0.05 * ambient_temp
-            - 0.04 * abs(tilt_angle - 30))
 
-def generate_monsoon_data_by_month(feature_ranges, months_days):
-    data = []
-    for month, days in months_days.items():
-        for _ in range(days):
-            irr = np.random.uniform(*feature_ranges['monsoon']['irradiance'])
-            hum = np.random.uniform(*feature_ranges['monsoon']['humidity'])
-            wind = np.random.uniform(*feature_ranges['monsoon']['wind_speed'])
-            temp = np.random.uniform(*feature_ranges['monsoon']['ambient_temperature'])
-            tilt = np.random.uniform(*feature_ranges['monsoon']['tilt_angle'])
+# Season specs (feature ranges, months, kWh coefficients) and the vectorised generator
+from solar_data import generate_season_data
 
-            kwh = calc_kwh_monsoon(irr, hum, wind, temp, tilt)
+# One seeded generator for the whole run, so the dataset is reproducible
+rng = np.random.default_rng(42)
 
-            data.append({
-                'irradiance': round(irr, 2),
-                'humidity': round(hum, 2),
-                'wind_speed': round(wind, 2),
-                'ambient_temperature': round(temp, 2),
-                'tilt_angle': round(tilt, 2),
-                'kwh': round(kwh, 2),
-                'season': 'monsoon',
-                'month': month
-            })
-    return pd.DataFrame(data)
 
-# Generate monsoon data matching days in each month
 
-
-
-
-df_summer = generate_summer_data_by_month(feature_ranges,summer_months_day)
+df_summer = generate_season_data('summer', rng=rng)
 print("\n\nSummer Data\n")
 # print(df_summer)
 
-df_winter = ganerate_winter_data_bt_month(feature_ranges,winter_months_day)
+df_winter = generate_season_data('winter', rng=rng)
 print("\n\Winter Data\n")
 # print(df_winter)
 
-df_monsoon = generate_monsoon_data_by_month(feature_ranges, monsoon_months_days)
+df_monsoon = generate_season_data('monsoon', rng=rng)
 print("\n\nMonsoon Data\n")
 # print(df_monsoon)
 
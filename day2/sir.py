@@ -1,56 +1,20 @@
 import numpy as np
 
-feature_ranges = {
-    'winter': {
-        'irradiance': (300, 700),
-        'humidity': (30, 70),
-        'wind_speed': (1, 6),
-        'ambient_temperature': (5, 20),
-        'tilt_angle': (10, 40),
-    }
-}
+from solar_data import SEASON_SPECS, SeasonModel, generate_season_data
 
-# Winter months with exact days
-winter_months_days = {
-    'November': 30,
-    'December': 31,
-    'January': 31,
-    'February': 28  # Not considering leap year here; can be adjusted if needed
+# Same winter ranges and months as main.py, with this panel's own coefficients
+winter_spec = {
+    **SEASON_SPECS['winter'],
+    'coefficients': {'irradiance': 0.18, 'humidity': -0.03, 'wind_speed': 0.015, 'ambient_temperature': 0.08},
+    'tilt_penalty': 0.02,
 }
+winter_model = SeasonModel({'winter': winter_spec})
 
-def calc_kwh_winter(irradiance, humidity, wind_speed, ambient_temp, tilt_angle):
-    return (0.18 * irradiance
-            - 0.03 * humidity
-            + 0.015 * wind_speed
-            + 0.08 * ambient_temp
-            - 0.02 * abs(tilt_angle - 30))
-
-def generate_winter_data_by_month(feature_ranges, months_days):
-    data = []
-    for month, days in months_days.items():
-        for _ in range(days):
-            irr = np.random.uniform(*feature_ranges['winter']['irradiance'])
-            hum = np.random.uniform(*feature_ranges['winter']['humidity'])
-            wind = np.random.uniform(*feature_ranges['winter']['wind_speed'])
-            temp = np.random.uniform(*feature_ranges['winter']['ambient_temperature'])
-            tilt = np.random.uniform(*feature_ranges['winter']['tilt_angle'])
-            
-            kwh = calc_kwh_winter(irr, hum, wind, temp, tilt)
-
-            data.append({
-                'irradiance': round(irr, 2),
-                'humidity': round(hum, 2),
-                'wind_speed': round(wind, 2),
-                'ambient_temperature': round(temp, 2),
-                'tilt_angle': round(tilt, 2),
-                'kwh': round(kwh, 2),
-                'season': 'winter',
-                'month': month
-            })
-    return pd.DataFrame(data)
+# One seeded generator for the whole run, so the dataset is reproducible
+rng = np.random.default_rng(42)
 
 # Generate winter data matching days in each month
-df_winter = generate_winter_data_by_month(feature_ranges, winter_months_days)
+df_winter = generate_season_data('winter', rng=rng, model=winter_model)
 
 print(df_winter.head())
 print(f'Total winter data points generated: {len(df_winter)}')  # Should be 31+31+28=90
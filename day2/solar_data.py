@@ -0,0 +1,306 @@
+import argparse
+import collections
+import itertools
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Synthetic solar panel dataset used by main.py.
+#
+#   python solar_data.py [rows]                          # time the generator on a large dataset
+#   python solar_data.py 100000000 --parquet solar_data/  # stream to Parquet partitioned by season/month
+#   python solar_data.py 100000000 --csv solar.csv        # stream to one appended CSV
+#   python solar_data.py --sites 64 --workers 8 --seed 7  # many sites in parallel, reproducible
+#
+# Seasons are declared as data (SEASON_SPECS) and compiled to coefficient
+# arrays. Features are drawn as one (n_days, 5) block, kWh for a batch of any
+# mix of seasons is one matmul plus the tilt term, and the DataFrame is built
+# from columns, so tens of millions of rows take seconds rather than hours.
+# For datasets larger than memory, iter_season_chunks yields fixed-size chunks
+# that the writers below append to disk one at a time, so peak memory depends
+# on the chunk size only. Parquet output needs pyarrow.
+# Multi-site runs give every site its own SeedSequence child stream, so a
+# master seed fixes the output whatever the number of worker processes.
+
+FEATURES = ['irradiance', 'humidity', 'wind_speed', 'ambient_temperature', 'tilt_angle']
+COLUMNS = FEATURES + ['kwh', 'season', 'month']
+TILT = FEATURES.index('tilt_angle')
+
+# Declarative season specs. Daily output is
+#   kwh = sum(coefficient * feature) - tilt_penalty * abs(tilt_angle - tilt_optimum)
+# so a new season or site is a new entry here, not a new function.
+SEASON_SPECS = {
+    'summer': {
+        'ranges': {
+            'irradiance': (600, 1000),
+            'humidity': (10, 50),
+            'wind_speed': (0, 5),
+            'ambient_temperature': (10, 40),
+            'tilt_angle': (10, 40),
+        },
+        'months': {'March': 31, 'April': 30, 'May': 31, 'June': 30},
+        'coefficients': {'irradiance': 0.25, 'humidity': -0.05, 'wind_speed': 0.02, 'ambient_temperature': 0.1},
+        'tilt_penalty': 0.03,
+        'tilt_optimum': 30,
+    },
+    'winter': {
+        'ranges': {
+            'irradiance': (300, 700),
+            'humidity': (30, 70),
+            'wind_speed': (1, 6),
+            'ambient_temperature': (5, 20),
+            'tilt_angle': (10, 40),
+        },
+        'months': {'November': 30, 'December': 31, 'January': 31, 'February': 28},
+        'coefficients': {'irradiance': 0.25, 'humidity': -0.025, 'wind_speed': 0.02, 'ambient_temperature': 0.1},
+        'tilt_penalty': 0.03,
+        'tilt_optimum': 30,
+    },
+    'monsoon': {
+        'ranges': {
+            'irradiance': (100, 600),
+            'humidity': (70, 100),
+            'wind_speed': (2, 8),
+            'ambient_temperature': (20, 35),
+            'tilt_angle': (10, 40),
+        },
+        'months': {'July': 31, 'August': 31, 'September': 30, 'October': 31},
+        'coefficients': {'irradiance': 0.15, 'humidity': -0.1, 'wind_speed': 0.01, 'ambient_temperature': 0.05},
+        'tilt_penalty': 0.04,
+        'tilt_optimum': 30,
+    },
+}
+
+
+# Season specs compiled to arrays, one row per season
+class SeasonModel:
+    def __init__(self, specs=SEASON_SPECS):
+        self.seasons = list(specs)
+        self.months = {season: spec['months'] for season, spec in specs.items()}
+        self.low = np.array([[spec['ranges'][feature][0] for feature in FEATURES] for spec in specs.values()],
+                            dtype=np.float64)
+        self.high = np.array([[spec['ranges'][feature][1] for feature in FEATURES] for spec in specs.values()],
+                             dtype=np.float64)
+        # Tilt enters only through the penalty term, so its linear coefficient is 0
+        self.coefficients = np.array([[spec['coefficients'].get(feature, 0.0) for feature in FEATURES]
+                                      for spec in specs.values()], dtype=np.float64)
+        self.tilt_penalty = np.array([spec['tilt_penalty'] for spec in specs.values()], dtype=np.float64)
+        self.tilt_optimum = np.array([spec['tilt_optimum'] for spec in specs.values()], dtype=np.float64)
+
+    def season_codes(self, seasons):
+        if isinstance(seasons, str):
+            return self.seasons.index(seasons)
+        seasons = np.asarray(seasons)
+        if np.issubdtype(seasons.dtype, np.integer):
+            return seasons
+        return pd.Categorical(seasons, categories=self.seasons).codes
+
+    def kwh(self, features, seasons):
+        # features: (n, 5) in FEATURES order; seasons: one season or one per row
+        codes = self.season_codes(seasons)
+        if np.ndim(codes) == 0:
+            linear = features @ self.coefficients[codes]
+        else:
+            # Mixed seasons: one matmul against every season, then each row's own column
+            linear = np.take_along_axis(features @ self.coefficients.T, codes[:, None], axis=1)[:, 0]
+        return linear - self.tilt_penalty[codes] * np.abs(features[:, TILT] - self.tilt_optimum[codes])
+
+    def draw_features(self, codes, rng):
+        # Uniform within each row's season ranges, built in place to limit peak memory
+        features = rng.random((len(codes), len(FEATURES)))
+        features *= (self.high - self.low)[codes]
+        features += self.low[codes]
+        return features
+
+    def month_column(self, season, repeats=1):
+        months = self.months[season]
+        return np.tile(np.repeat(list(months), list(months.values())), repeats)
+
+
+SEASON_MODEL = SeasonModel()
+
+
+def _frame(features, kwh, seasons, months):
+    data = {feature: features[:, column].round(2) for column, feature in enumerate(FEATURES)}
+    data['kwh'] = kwh.round(2)
+    data['season'] = seasons
+    data['month'] = months
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+# One row per day of each month of a season, repeated `repeats` times (e.g. sites x years)
+def generate_season_data(season, repeats=1, rng=None, model=SEASON_MODEL):
+    rng = np.random.default_rng() if rng is None else rng
+    months = model.month_column(season, repeats)
+    code = model.season_codes(season)
+    features = model.draw_features(np.full(len(months), code), rng)
+    return _frame(features, model.kwh(features, code), season, months)
+
+
+# Every season in one mixed batch: a single draw and a single kWh evaluation
+def generate_all_seasons(repeats=1, rng=None, model=SEASON_MODEL):
+    rng = np.random.default_rng() if rng is None else rng
+    months = [model.month_column(season, repeats) for season in model.seasons]
+    codes = np.repeat(np.arange(len(model.seasons)), [len(season_months) for season_months in months])
+    features = model.draw_features(codes, rng)
+    return _frame(features, model.kwh(features, codes), np.asarray(model.seasons)[codes], np.concatenate(months))
+
+
+# All seasons as a stream of chunk_rows-row DataFrames. The rows follow one
+# cycle of every season's days, repeated until `rows` rows have been produced.
+def iter_season_chunks(rows, chunk_rows=1_000_000, rng=None, model=SEASON_MODEL):
+    rng = np.random.default_rng() if rng is None else rng
+    cycle_months = [model.month_column(season) for season in model.seasons]
+    cycle_codes = np.repeat(np.arange(len(model.seasons)), [len(months) for months in cycle_months])
+    cycle_months = np.concatenate(cycle_months)
+    for offset in range(0, rows, chunk_rows):
+        index = np.arange(offset, min(offset + chunk_rows, rows)) % len(cycle_codes)
+        codes = cycle_codes[index]
+        features = model.draw_features(codes, rng)
+        yield _frame(features, model.kwh(features, codes), np.asarray(model.seasons)[codes], cycle_months[index])
+
+
+def _generate_site(site, seed_sequence, repeats, model):
+    df = generate_all_seasons(repeats, np.random.default_rng(seed_sequence), model)
+    df.insert(0, 'site', site)
+    return df
+
+
+# One all-seasons DataFrame per site, in site order. Site i always draws from
+# child i of the master seed, so the frames do not depend on `workers`. At most
+# two sites per worker are in flight or waiting to be consumed, so memory stays
+# flat however many sites there are.
+def iter_sites(sites, seed=0, repeats=1, workers=None, model=SEASON_MODEL):
+    sites = [f"site-{number}" for number in range(sites)] if isinstance(sites, int) else list(sites)
+    streams = np.random.SeedSequence(seed).spawn(len(sites))
+    args = (sites, streams, itertools.repeat(repeats), itertools.repeat(model))
+    if workers == 1:
+        yield from map(_generate_site, *args)
+        return
+    workers = workers or os.cpu_count() or 1
+    pending = collections.deque()
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            for site_args in zip(*args):
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+                pending.append(pool.submit(_generate_site, *site_args))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # The consumer stopped early: do not generate sites nobody will read
+            for future in pending:
+                future.cancel()
+
+
+def generate_sites(sites, seed=0, repeats=1, workers=None, model=SEASON_MODEL):
+    return pd.concat(iter_sites(sites, seed, repeats, workers, model), ignore_index=True)
+
+
+def write_csv(chunks, path):
+    # One CSV, header from the first chunk, every later chunk appended
+    rows = 0
+    for number, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if number == 0 else 'a', header=number == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+# Hive-style layout, root/season=<season>/month=<month>/part-0.parquet. Each
+# partition file stays open and every chunk adds one row group to it.
+def write_parquet(chunks, root, compression='zstd'):
+    pa = _pyarrow()
+    writers = {}
+    rows = 0
+    try:
+        for chunk in chunks:
+            for (season, month), part in chunk.groupby(['season', 'month'], sort=False):
+                table = pa.Table.from_pandas(part.drop(columns=['season', 'month']), preserve_index=False)
+                writer = writers.get((season, month))
+                if writer is None:
+                    directory = os.path.join(root, f"season={season}", f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    writer = writers[season, month] = pa.parquet.ParquetWriter(
+                        os.path.join(directory, "part-0.parquet"), table.schema, compression=compression)
+                writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+# Reads only the matching partition directories; the others are never opened
+def read_parquet(root, season=None, month=None):
+    _pyarrow()
+    filters = [(column, '=', value) for column, value in (('season', season), ('month', month)) if value is not None]
+    df = pd.read_parquet(root, engine='pyarrow', filters=filters or None)
+    # Partition columns come back last, as categories
+    for column in ('season', 'month'):
+        df[column] = df[column].astype(str)
+    return df
+
+
+def peak_rss_mib():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic solar dataset and time it")
+    parser.add_argument("rows", nargs="?", type=int, default=10_000_000, help="rows to generate (default: %(default)s)")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000,
+                        help="rows per chunk when streaming to disk (default: %(default)s)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--parquet", metavar="DIR", help="stream to Parquet partitioned by season and month")
+    output.add_argument("--csv", metavar="PATH", help="stream to one CSV file")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--sites", type=int, help="simulate this many sites, `rows` rows each, one child seed per site")
+    parser.add_argument("--workers", type=int, help="processes for --sites (default: one per CPU)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    rng = np.random.default_rng(args.seed)
+    days = sum(sum(months.values()) for months in SEASON_MODEL.months.values())
+    repeats = max(1, round(args.rows / days))
+
+    started = time.perf_counter()
+    if args.sites and not (args.parquet or args.csv):
+        df = generate_sites(args.sites, args.seed, repeats, args.workers)
+        elapsed = time.perf_counter() - started
+        print(f"{args.sites} sites, {len(df):,} rows in {elapsed:.2f} s ({len(df) / elapsed:,.0f} rows/s) "
+              f"with {args.workers or os.cpu_count()} workers")
+        return 0
+    if args.parquet or args.csv:
+        if args.sites:
+            chunks = iter_sites(args.sites, args.seed, repeats, args.workers)
+        else:
+            chunks = iter_season_chunks(args.rows, args.chunk_rows, rng)
+        rows = write_parquet(chunks, args.parquet) if args.parquet else write_csv(chunks, args.csv)
+        elapsed = time.perf_counter() - started
+        print(f"{rows:,} rows written to {args.parquet or args.csv} in {elapsed:.2f} s "
+              f"({rows / elapsed:,.0f} rows/s), peak RSS {peak_rss_mib():,.0f} MiB")
+        return 0
+
+    df = generate_all_seasons(repeats=repeats, rng=rng)
+    elapsed = time.perf_counter() - started
+    print(f"{len(df):,} rows in {elapsed:.2f} s ({len(df) / elapsed:,.0f} rows/s), "
+          f"{df.memory_usage(deep=True).sum() / 2**20:,.0f} MiB, peak RSS {peak_rss_mib():,.0f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
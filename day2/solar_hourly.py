@@ -0,0 +1,135 @@
+import argparse
+import calendar
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from solar_data import COLUMNS, FEATURES, SEASON_MODEL
+
+# Hourly synthetic solar data on a real calendar (solar_data.py is one row per day).
+#
+#   python solar_hourly.py --years 10 --sites 100   # time the generator, then the daily downsample
+#
+# Timestamps come from a DatetimeIndex, so leap years have 8784 hours, and each
+# day's season follows from its month. Every day still draws its features from
+# the season spec, as solar_data does. The day's peak irradiance is then spread
+# over the hours along the sun-elevation curve for the site's latitude, and the
+# day's kWh is split in proportion to it. Temperature, humidity and wind follow
+# a daily swing that averages out. to_daily therefore gives back the daily
+# schema: peak irradiance, mean conditions and total kWh per day.
+# Times are local solar time: the sun is highest at 12:00.
+
+MONTHS = list(calendar.month_name)[1:]
+TEMPERATURE_SWING = 5.0  # degrees C above/below the daily mean, warmest at 15:00
+HUMIDITY_SWING = 10.0    # percentage points, the inverse of temperature
+WIND_SWING = 0.3         # fraction of the daily mean wind speed
+WARMEST_HOUR = 15
+
+
+# Sine of the sun's elevation; day_of_year, solar_hour and latitude (degrees) broadcast
+def sun_elevation_sine(day_of_year, solar_hour, latitude):
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day_of_year) / 365)
+    hour_angle = np.radians(15 * (solar_hour - 12))
+    latitude = np.radians(latitude)
+    return (np.sin(latitude) * np.sin(declination)
+            + np.cos(latitude) * np.cos(declination) * np.cos(hour_angle))
+
+
+def season_of_month(model=SEASON_MODEL):
+    month_seasons = {month: season for season, months in model.months.items() for month in months}
+    missing = [month for month in MONTHS if month not in month_seasons]
+    if missing:
+        raise ValueError(f"No season covers {', '.join(missing)}")
+    return np.array([model.seasons.index(month_seasons[month]) for month in MONTHS])
+
+
+# One row per hour per site: (366 or 365) * 24 * years * sites rows
+def generate_hourly(years=1, start_year=2024, sites=1, latitude=18.5, rng=None, model=SEASON_MODEL):
+    rng = np.random.default_rng() if rng is None else rng
+    site_names = [f"site-{number}" for number in range(sites)] if isinstance(sites, int) else list(sites)
+    hours = pd.date_range(f"{start_year}-01-01", f"{start_year + years}-01-01", freq="h", inclusive="left")
+    days = hours[::24]
+    n_sites, n_days = len(site_names), len(days)
+
+    # Daily draws, exactly as in the daily dataset, laid out (site, day)
+    month_codes = np.tile(days.month.to_numpy() - 1, n_sites)
+    day_codes = season_of_month(model)[month_codes]
+    daily = model.draw_features(day_codes, rng)
+    daily_kwh = model.kwh(daily, day_codes).reshape(n_sites, n_days, 1)
+    daily = daily.reshape(n_sites, n_days, 1, len(FEATURES))
+
+    # Sun over (site, day, hour), at the middle of each hour
+    latitude = np.broadcast_to(np.asarray(latitude, dtype=np.float64), (n_sites,))
+    sun = np.clip(sun_elevation_sine(days.dayofyear.to_numpy()[None, :, None], np.arange(24) + 0.5,
+                                     latitude[:, None, None]), 0, None)
+    peak = sun.max(axis=2, keepdims=True)
+    shape = np.divide(sun, peak, out=np.zeros_like(sun), where=peak > 0)
+    # Polar night: no sun at all, the day's kWh is spread evenly
+    weights = np.divide(sun, sun.sum(axis=2, keepdims=True), out=np.full_like(sun, 1 / 24), where=peak > 0)
+
+    swing = np.cos(2 * np.pi * (np.arange(24) - WARMEST_HOUR) / 24)  # sums to 0 over a day
+    humidity = daily[..., 1]
+    humidity_swing = np.minimum(HUMIDITY_SWING, np.minimum(humidity, 100 - humidity))  # stays within 0-100
+    hourly = {
+        'irradiance': daily[..., 0] * shape,
+        'humidity': humidity - humidity_swing * swing,
+        'wind_speed': daily[..., 2] * (1 + WIND_SWING * swing),
+        'ambient_temperature': daily[..., 3] + TEMPERATURE_SWING * swing,
+        'tilt_angle': np.broadcast_to(daily[..., 4], sun.shape),
+        'kwh': daily_kwh * weights,
+    }
+
+    data = {
+        'site': pd.Categorical.from_codes(np.repeat(np.arange(n_sites), len(hours)), site_names),
+        'time': np.tile(hours.to_numpy(), n_sites),
+    }
+    data.update((column, values.ravel()) for column, values in hourly.items())
+    data['season'] = pd.Categorical.from_codes(np.repeat(day_codes, 24), model.seasons)
+    data['month'] = pd.Categorical.from_codes(np.repeat(month_codes, 24), MONTHS)
+    return pd.DataFrame(data)
+
+
+# Back to one row per site and day, in the daily dataset's columns (site first)
+def to_daily(hourly):
+    grouped = hourly.groupby(['site', hourly['time'].dt.normalize()], sort=False, observed=True)
+    daily = grouped.agg(
+        irradiance=('irradiance', 'max'),
+        humidity=('humidity', 'mean'),
+        wind_speed=('wind_speed', 'mean'),
+        ambient_temperature=('ambient_temperature', 'mean'),
+        tilt_angle=('tilt_angle', 'first'),
+        kwh=('kwh', 'sum'),
+        season=('season', 'first'),
+        month=('month', 'first'),
+    ).reset_index()
+    daily[FEATURES + ['kwh']] = daily[FEATURES + ['kwh']].round(2)
+    for column in ('site', 'season', 'month'):
+        daily[column] = daily[column].astype(str)
+    return daily[['site'] + COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hourly solar generator and its daily downsample")
+    parser.add_argument("--years", type=int, default=10, help="calendar years per site (default: %(default)s)")
+    parser.add_argument("--start-year", type=int, default=2024, help="first year (default: %(default)s)")
+    parser.add_argument("--sites", type=int, default=100, help="sites (default: %(default)s)")
+    parser.add_argument("--latitude", type=float, default=18.5, help="site latitude in degrees (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    hourly = generate_hourly(args.years, args.start_year, args.sites, args.latitude, np.random.default_rng(args.seed))
+    elapsed = time.perf_counter() - started
+    print(f"{len(hourly):,} hourly rows in {elapsed:.2f} s ({len(hourly) / elapsed:,.0f} rows/s), "
+          f"{hourly.memory_usage(deep=True).sum() / 2**20:,.0f} MiB")
+
+    started = time.perf_counter()
+    daily = to_daily(hourly)
+    print(f"{len(daily):,} daily rows in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
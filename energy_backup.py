@@ -0,0 +1,339 @@
+# Incremental backup and restore for the Workshop.profile collection.
+#
+#   python energy_backup.py backup            # export records newer than the last backup
+#   python energy_backup.py restore [--drop]  # reload every chunk into the collection
+#   python energy_backup.py bench             # encode/compress/decode speed, no server needed
+#
+# A backup directory holds gzip-compressed NDJSON chunks (Extended JSON, one
+# document per line) and a manifest.json recording every finished chunk. A
+# chunk is written to a .tmp file and renamed only when complete, and the
+# manifest is updated after that, so rerunning an interrupted backup resumes
+# from the last finished chunk.
+#
+# Records are picked up by their server-side inserted_at stamp (see
+# energy_db.stamp_inserted), not the client "timestamp", which predates
+# write-behind and spooled inserts. Stamps from concurrent batches can become
+# visible slightly out of order, so each backup re-reads SAFETY_WINDOW behind
+# the newest stamp exported and skips the _ids the manifest already lists for
+# that window. Records without a stamp (written before it existed) are only
+# exported by the first backup.
+# Restore loads the chunks in parallel worker processes, one chunk at a time.
+
+import argparse
+import datetime
+import gzip
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pymongo
+from bson import ObjectId, json_util
+from bson.json_util import DatetimeRepresentation, JSONMode, JSONOptions
+from pymongo.errors import BulkWriteError
+
+from energy_db import (
+    DUPLICATE_KEY,
+    INSERTED_AT_FIELD,
+    MONGO_URI,
+    connect,
+    ensure_indexes,
+    parse_write_concern,
+    rebuild_rollups,
+)
+
+BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backup", "profile")
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 100000
+RESTORE_BATCH_SIZE = 10000
+RESTORE_WORKERS = os.cpu_count() or 4
+SAFETY_WINDOW = datetime.timedelta(minutes=5)
+
+# Dates as {"$date": <ms since epoch>}, which decodes far faster than ISO strings
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.LEGACY, datetime_representation=DatetimeRepresentation.LEGACY)
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _default(value):
+    # Fast paths for the types every record has, written exactly as json_util
+    # writes them; anything else goes to json_util
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return {"$date": (value - EPOCH) // datetime.timedelta(milliseconds=1)}
+    return json_util.default(value, JSON_OPTIONS)
+
+
+def encode_record(record):
+    return json.dumps(record, default=_default)
+
+
+def _object_hook(obj):
+    # Fast paths for the wrappers every record has; anything else goes to json_util
+    if len(obj) == 1:
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$date" in obj and isinstance(obj["$date"], int):
+            return EPOCH + datetime.timedelta(milliseconds=obj["$date"])
+    for key in obj:
+        if key.startswith("$"):
+            return json_util.object_hook(obj, JSON_OPTIONS)
+        break
+    return obj
+
+
+def decode_record(line):
+    return json.loads(line, object_hook=_object_hook)
+
+
+# Manifest handling
+def load_manifest(backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    manifest = {"chunks": [], "last_inserted_at": None, "recent": []}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as manifest_file:
+            # A manifest from before inserted_at has no position; it starts over
+            # and restore skips the records it already holds
+            manifest.update(json_util.loads(manifest_file.read()))
+    return manifest
+
+
+def save_manifest(backup_dir, manifest):
+    # Write then rename, so a crash never leaves a half-written manifest
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as manifest_file:
+        manifest_file.write(json_util.dumps(manifest, indent=2))
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def chunk_name(number):
+    return f"chunk-{number:06d}.ndjson.gz"
+
+
+# Backup
+def backup_query(last_inserted_at):
+    # Ascending (inserted_at, _id), served by the inserted_at_id index
+    if last_inserted_at is None:
+        return {}
+    return {INSERTED_AT_FIELD: {"$gte": last_inserted_at - SAFETY_WINDOW}}
+
+
+def write_chunk(backup_dir, number, records):
+    path = os.path.join(backup_dir, chunk_name(number))
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=6) as chunk_file:
+        for record in records:
+            chunk_file.write(encode_record(record) + "\n")
+    with open(path + ".tmp", "rb") as chunk_file:
+        os.fsync(chunk_file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def backup(collection, backup_dir=BACKUP_DIR, chunk_size=CHUNK_SIZE):
+    os.makedirs(backup_dir, exist_ok=True)
+    # Leftovers of an interrupted run; their records are exported again
+    for name in os.listdir(backup_dir):
+        if name.endswith(".ndjson.gz.tmp"):
+            os.remove(os.path.join(backup_dir, name))
+
+    manifest = load_manifest(backup_dir)
+    # _id -> inserted_at of the records already exported inside the safety window
+    recent = {_id: inserted_at for inserted_at, _id in manifest["recent"]}
+    cursor = (collection.find(backup_query(manifest["last_inserted_at"]))
+              .sort([(INSERTED_AT_FIELD, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)])
+              .batch_size(min(chunk_size, 10000)))
+
+    exported = 0
+    chunk = []
+    for record in cursor:
+        if record["_id"] in recent:
+            continue
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            exported += finish_chunk(backup_dir, manifest, chunk, recent)
+            chunk = []
+    if chunk:
+        exported += finish_chunk(backup_dir, manifest, chunk, recent)
+    return exported
+
+
+def finish_chunk(backup_dir, manifest, records, recent):
+    number = len(manifest["chunks"]) + 1
+    write_chunk(backup_dir, number, records)
+    manifest["chunks"].append({"file": chunk_name(number), "records": len(records)})
+
+    stamps = [record[INSERTED_AT_FIELD] for record in records if record.get(INSERTED_AT_FIELD) is not None]
+    if stamps:
+        last = max(stamps + [manifest["last_inserted_at"] or stamps[-1]])
+        manifest["last_inserted_at"] = last
+        for record in records:
+            if record.get(INSERTED_AT_FIELD) is not None:
+                recent[record["_id"]] = record[INSERTED_AT_FIELD]
+        for _id in [_id for _id, inserted_at in recent.items() if inserted_at < last - SAFETY_WINDOW]:
+            del recent[_id]
+        manifest["recent"] = [[inserted_at, _id] for _id, inserted_at in recent.items()]
+    save_manifest(backup_dir, manifest)
+    return len(records)
+
+
+# Restore
+def iter_chunk(path):
+    with gzip.open(path, "rt", encoding="utf-8") as chunk_file:
+        for line in chunk_file:
+            yield decode_record(line)
+
+
+def insert_batch(collection, batch):
+    # Returns (inserted, skipped); records that already exist are skipped
+    try:
+        collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+        return len(batch), 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        return len(batch) - len(errors), len(errors)
+
+
+def restore_chunk(uri, path, batch_size, write_concern=None):
+    # Runs in a worker process with its own client
+    collection = connect(uri)
+    write_concern = parse_write_concern(write_concern)
+    if write_concern is not None:
+        collection = collection.with_options(write_concern=write_concern)
+
+    inserted = skipped = 0
+    batch = []
+    for record in iter_chunk(path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            counts = insert_batch(collection, batch)
+            inserted += counts[0]
+            skipped += counts[1]
+            batch = []
+    if batch:
+        counts = insert_batch(collection, batch)
+        inserted += counts[0]
+        skipped += counts[1]
+    collection.database.client.close()
+    return inserted, skipped
+
+
+def restore(uri=None, backup_dir=BACKUP_DIR, batch_size=RESTORE_BATCH_SIZE, workers=RESTORE_WORKERS,
+            drop=False, write_concern=None):
+    collection = connect(uri)
+    if drop:
+        collection.drop()
+
+    paths = [os.path.join(backup_dir, chunk["file"]) for chunk in load_manifest(backup_dir)["chunks"]]
+    inserted = skipped = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(restore_chunk, uri, path, batch_size, write_concern) for path in paths]
+        for future in futures:
+            counts = future.result()
+            inserted += counts[0]
+            skipped += counts[1]
+
+    # Indexes are cheaper to build once the data is loaded; rollups bypassed the app
+    ensure_indexes(collection)
+    rebuild_rollups(collection)
+    return inserted, skipped
+
+
+# Benchmark of the client side of backup and restore (Extended JSON, gzip),
+# on synthetic records shaped like the app's; no server involved
+def sample_records(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    for number in range(count):
+        when = start + datetime.timedelta(seconds=number * 30)
+        energy = round(rng.uniform(1, 40), 2)
+        yield {
+            "_id": ObjectId(), "name": f"user-{number % 5000}", "age": rng.randint(18, 90),
+            "city": f"city-{number % 50}", "area": f"area-{number % 400}",
+            "appliances": {appliance: rng.randint(0, 6) for appliance in
+                           ("light", "fans", "tv", "ac", "fridge", "washing_machine")},
+            "energy_kwh_per_day": energy, "estimated_daily_cost": round(energy * 5, 2),
+            "estimated_monthly_cost": round(energy * 150, 2), "estimated_yearly_cost": round(energy * 1825, 2),
+            "date": when.strftime("%Y-%m-%d"), "day_of_week": when.strftime("%A"),
+            "timestamp": when, INSERTED_AT_FIELD: when.replace(microsecond=0),
+        }
+
+
+def count_chunk(path):
+    return sum(1 for _ in iter_chunk(path))
+
+
+def benchmark(count=1_000_000, chunk_size=CHUNK_SIZE, workers=RESTORE_WORKERS):
+    with tempfile.TemporaryDirectory() as backup_dir:
+        # Only writing the chunks is timed, not making up the records
+        manifest = {"chunks": [], "last_inserted_at": None, "recent": []}
+        recent = {}
+        records = sample_records(count)
+        backup_s = 0.0
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            started = time.perf_counter()
+            finish_chunk(backup_dir, manifest, chunk, recent)
+            backup_s += time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(backup_dir, chunk["file"])) for chunk in manifest["chunks"])
+
+        started = time.perf_counter()
+        paths = [os.path.join(backup_dir, chunk["file"]) for chunk in manifest["chunks"]]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            decoded = sum(executor.map(count_chunk, paths))
+        decode_s = time.perf_counter() - started
+    return {"records": count, "bytes": size, "backup_s": backup_s, "decode_s": decode_s, "decoded": decoded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backup and restore the energy tracker records")
+    parser.add_argument("--uri", help=f"MongoDB URI (default: $ENERGY_TRACKER_MONGO_URI or {MONGO_URI})")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="export records added since the last backup")
+    backup_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="records per chunk file")
+
+    restore_parser = commands.add_parser("restore", help="load every backup chunk into the collection")
+    restore_parser.add_argument("--drop", action="store_true", help="drop the collection before restoring")
+    restore_parser.add_argument("--batch-size", type=int, default=RESTORE_BATCH_SIZE, help="records per insert_many")
+    restore_parser.add_argument("--workers", type=int, default=RESTORE_WORKERS, help="worker processes, one chunk each")
+    restore_parser.add_argument("--write-concern", help='w option for the restore writes, e.g. "1" or "majority"')
+
+    bench_parser = commands.add_parser("bench", help="time encoding/compression and decoding without a server")
+    bench_parser.add_argument("--records", type=int, default=1_000_000, help="synthetic records (default: %(default)s)")
+    bench_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="records per chunk file")
+    bench_parser.add_argument("--workers", type=int, default=RESTORE_WORKERS, help="decoding processes")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "bench":
+        result = benchmark(args.records, args.chunk_size, args.workers)
+        print(f"{result['records']:,} records: written to {result['bytes'] / 2**20:,.1f} MiB of chunks in "
+              f"{result['backup_s']:.1f} s ({result['records'] / result['backup_s']:,.0f} records/s), "
+              f"decoded in {result['decode_s']:.1f} s ({result['decoded'] / result['decode_s']:,.0f} records/s)")
+    elif args.command == "backup":
+        exported = backup(connect(args.uri), args.dir, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"Backed up {exported} records in {elapsed:.1f} s to {args.dir}")
+    else:
+        inserted, skipped = restore(args.uri, args.dir, args.batch_size, args.workers, args.drop,
+                                    args.write_concern)
+        elapsed = time.perf_counter() - started
+        rate = inserted / elapsed if elapsed else 0
+        print(f"Restored {inserted} records ({skipped} already present) in {elapsed:.1f} s, {rate:,.0f} records/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Trend charts for long energy histories (f5.py, f4_flat_ui.py).
+# A plot is only a few hundred pixels wide, so series longer than the point
+# budget are reduced before they are sent to the browser, and large traces are
+# drawn with WebGL instead of SVG.
+
+TREND_MAX_POINTS = 2000  # about two points per horizontal pixel on a wide chart
+WEBGL_THRESHOLD = 1000   # above this many points SVG rendering gets sluggish
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def _numeric_x(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        # Days since the first point; keeps the triangle areas well scaled
+        x = x.astype('datetime64[ns]').astype(np.int64)
+        return (x - x[0]) / 86400e9
+    return x.astype(np.float64)
+
+
+# Largest-Triangle-Three-Buckets: keeps the first and last point and, from each
+# bucket in between, the point forming the largest triangle with the point kept
+# before it and the average of the next bucket. Preserves the visual shape.
+def lttb_indices(x, y, n_out):
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _numeric_x(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# Min/max bucketing: the lowest and highest point of each bucket, in time
+# order. Cheaper than LTTB and never hides a spike.
+def minmax_indices(y, n_out):
+    n = len(y)
+    buckets = n_out // 2
+    if buckets < 1 or n <= n_out:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def downsample(x, y, max_points=TREND_MAX_POINTS, method='lttb'):
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}, expected one of {DOWNSAMPLE_METHODS}")
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    if method == 'lttb':
+        indices = lttb_indices(x, y, max_points)
+    else:
+        indices = minmax_indices(y, max_points)
+    return x[indices], y[indices]
+
+
+def trend_figure(x, y, title, x_label='date', y_label='total_energy', total_points=None, height=300):
+    # x/y are usually already reduced; total_points is the length before that
+    total_points = len(y) if total_points is None else total_points
+    trace = go.Scattergl if len(y) > WEBGL_THRESHOLD else go.Scatter
+    fig = go.Figure(trace(x=x, y=y, mode='lines', name=y_label))
+    if total_points > len(y):
+        title = f"{title} ({len(y):,} of {total_points:,} points)"
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, height=height)
+    return fig
@@ -0,0 +1,801 @@
+# MongoDB helpers for the Energy Consumption Tracker (light_cal_ui.py).
+# Nothing in here imports streamlit, so the same code can be reused from
+# command line tools.
+
+import argparse
+import atexit
+import csv
+import io
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pymongo
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+MONGO_URI = "mongodb://localhost:27017/"
+DATABASE_NAME = "Workshop"
+COLLECTION_NAME = "profile"
+ROLLUP_COLLECTION_NAME = "profile_daily"
+
+ENERGY_FIELD = "energy_kwh_per_day"
+INSERTED_AT_FIELD = "inserted_at"  # server clock, set when the record is written
+ROLLUP_MARK_FIELD = "rollup"  # the claiming attempt's token, then True once counted in the rollups
+DUPLICATE_KEY = 11000
+
+
+# Settings come from ENERGY_TRACKER_* environment variables
+def env_setting(name, default, cast=str):
+    value = os.environ.get("ENERGY_TRACKER_" + name)
+    return default if value in (None, "") else cast(value)
+
+
+def parse_write_concern(value):
+    # "majority", "1", "0" ... as accepted by the w option
+    if value is None:
+        return None
+    return WriteConcern(w=int(value) if str(value).isdigit() else value)
+
+
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backup", "energytracker_backup.json")
+REJECTED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backup", "energytracker_rejected.json")
+
+
+def connect(uri=None):
+    # Small timeouts so an unreachable server fails fast instead of blocking the page
+    client = pymongo.MongoClient(
+        uri or env_setting("MONGO_URI", MONGO_URI),
+        maxPoolSize=env_setting("POOL_SIZE", 20, int),
+        serverSelectionTimeoutMS=env_setting("SERVER_TIMEOUT_MS", 2000, int),
+        connectTimeoutMS=env_setting("CONNECT_TIMEOUT_MS", 2000, int),
+        socketTimeoutMS=env_setting("SOCKET_TIMEOUT_MS", 10000, int),
+    )
+    return client[DATABASE_NAME][COLLECTION_NAME]
+
+
+def prepare_collection(collection):
+    ensure_indexes(collection)
+    # First start after upgrading: build the rollups from existing records
+    if (rollup_collection(collection).estimated_document_count() == 0
+            and collection.estimated_document_count() > 0):
+        rebuild_rollups(collection)
+
+
+# Runs prepare_collection once per process, on the first call that succeeds.
+# This is kept apart from the circuit breaker: the write-behind flush thread may
+# see the database come back first, and the preparation must still happen.
+class CollectionSetup:
+    def __init__(self, collection):
+        self.collection = collection
+        self.prepared = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        # Raises whatever prepare_collection raises; the next call tries again
+        if self.prepared:
+            return
+        with self._lock:
+            if not self.prepared:
+                prepare_collection(self.collection)
+                self.prepared = True
+
+
+def rollup_collection(collection):
+    return collection.database[ROLLUP_COLLECTION_NAME]
+
+
+# Indexes the app relies on: the History sort and the name/city lookups
+PROFILE_INDEXES = [
+    pymongo.IndexModel([("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], name="timestamp_id_desc"),
+    pymongo.IndexModel([("name", pymongo.ASCENDING), ("date", pymongo.ASCENDING)], name="name_date"),
+    pymongo.IndexModel([("city", pymongo.ASCENDING), ("date", pymongo.ASCENDING)], name="city_date"),
+    # Incremental backups (energy_backup.py)
+    pymongo.IndexModel([(INSERTED_AT_FIELD, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)], name="inserted_at_id"),
+]
+
+
+def ensure_indexes(collection):
+    # create_indexes is a no-op for indexes that already exist
+    return collection.create_indexes(PROFILE_INDEXES)
+
+
+# Daily rollups: one document per (date, city) in profile_daily, holding
+# the count plus sum/min/max of the energy and cost fields
+ROLLUP_FIELDS = {
+    "energy": ENERGY_FIELD,
+    "daily_cost": "estimated_daily_cost",
+    "monthly_cost": "estimated_monthly_cost",
+    "yearly_cost": "estimated_yearly_cost",
+}
+ROLLUP_STATS = ["count"] + [f"{prefix}_{stat}" for prefix in ROLLUP_FIELDS for stat in ("sum", "min", "max")]
+
+
+def rollup_updates(records, token):
+    # Records are combined per (date, city) first, so a batch costs one upsert per group.
+    # A rollup that already lists the token is left alone (see apply_rollups).
+    groups = {}
+    for record in records:
+        key = (record.get("date"), record.get("city"))
+        update = groups.setdefault(key, {"$inc": {"count": 0}, "$min": {}, "$max": {}})
+        update["$inc"]["count"] += 1
+        for prefix, field in ROLLUP_FIELDS.items():
+            value = record.get(field)
+            value = 0 if value is None else value
+            update["$inc"][prefix + "_sum"] = update["$inc"].get(prefix + "_sum", 0) + value
+            update["$min"][prefix + "_min"] = min(update["$min"].get(prefix + "_min", value), value)
+            update["$max"][prefix + "_max"] = max(update["$max"].get(prefix + "_max", value), value)
+
+    return [
+        pymongo.UpdateOne(
+            {"_id": {"date": date, "city": city}, "applied": {"$ne": token}},
+            dict(update, **{"$setOnInsert": {"date": date, "city": city}, "$addToSet": {"applied": token}}),
+            upsert=True,
+        )
+        for (date, city), update in groups.items()
+    ]
+
+
+def apply_rollups(collection, records):
+    # Counts each written record exactly once, also when a batch is replayed after
+    # failing halfway. Records not counted yet are claimed with a fresh token; each
+    # rollup lists the tokens it has applied until the records are marked done, so
+    # a retry after a failure anywhere in between skips what already went in.
+    ids = [record["_id"] for record in records]
+    if not ids:
+        return
+    collection.update_many({"_id": {"$in": ids}, ROLLUP_MARK_FIELD: {"$exists": False}},
+                           {"$set": {ROLLUP_MARK_FIELD: ObjectId()}})
+    marks = {
+        doc["_id"]: doc[ROLLUP_MARK_FIELD]
+        for doc in collection.find({"_id": {"$in": ids}, ROLLUP_MARK_FIELD: {"$ne": True}},
+                                   {ROLLUP_MARK_FIELD: 1})
+    }
+    claimed = {}
+    for record in records:
+        if record["_id"] in marks:
+            claimed.setdefault(marks[record["_id"]], []).append(record)
+    if not claimed:
+        return
+
+    rollups = rollup_collection(collection)
+    operations = [operation for token, group in claimed.items() for operation in rollup_updates(group, token)]
+    try:
+        rollups.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # A rollup that already lists the token does not match, and its upsert then
+        # collides with it on _id: that group was applied by the earlier attempt
+        if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+    collection.update_many({"_id": {"$in": list(marks)}}, {"$set": {ROLLUP_MARK_FIELD: True}})
+    keys = {(record.get("date"), record.get("city")) for group in claimed.values() for record in group}
+    rollups.update_many({"_id": {"$in": [{"date": date, "city": city} for date, city in keys]}},
+                        {"$pull": {"applied": {"$in": list(claimed)}}})
+
+
+def rollup_pipeline():
+    group = {"_id": {"date": "$date", "city": "$city"}, "count": {"$sum": 1}}
+    for prefix, field in ROLLUP_FIELDS.items():
+        value = {"$ifNull": ["$" + field, 0]}
+        group[prefix + "_sum"] = {"$sum": value}
+        group[prefix + "_min"] = {"$min": value}
+        group[prefix + "_max"] = {"$max": value}
+    return [
+        {"$group": group},
+        {"$addFields": {"date": "$_id.date", "city": "$_id.city"}},
+    ]
+
+
+def rebuild_rollups(collection):
+    # Every record is counted by the rebuild, so none may be applied again later
+    collection.update_many({ROLLUP_MARK_FIELD: {"$ne": True}}, {"$set": {ROLLUP_MARK_FIELD: True}})
+    # $out swaps the new collection in atomically once the pipeline finishes
+    pipeline = rollup_pipeline() + [{"$out": ROLLUP_COLLECTION_NAME}]
+    collection.aggregate(pipeline, allowDiskUse=True)
+    return rollup_collection(collection).count_documents({})
+
+
+def verify_rollups(collection):
+    expected = {
+        (doc["_id"].get("date"), doc["_id"].get("city")): doc
+        for doc in collection.aggregate(rollup_pipeline(), allowDiskUse=True)
+    }
+    mismatches = []
+    for doc in rollup_collection(collection).find():
+        key = (doc["_id"].get("date"), doc["_id"].get("city"))
+        raw = expected.pop(key, None)
+        if raw is None:
+            mismatches.append(f"{key}: rollup has no matching raw records")
+            continue
+        for stat in ROLLUP_STATS:
+            # $inc adds floats in a different order than $sum, so allow rounding noise
+            if not math.isclose(doc.get(stat, 0), raw[stat], rel_tol=1e-9, abs_tol=1e-6):
+                mismatches.append(f"{key}: {stat} is {doc.get(stat)}, raw data gives {raw[stat]}")
+    for key in expected:
+        mismatches.append(f"{key}: raw records have no rollup")
+    return mismatches
+
+
+# Summary metrics for the History page, read from the rollups
+def summary_pipeline():
+    return [
+        {"$group": {
+            "_id": None,
+            "total_records": {"$sum": "$count"},
+            "energy_sum": {"$sum": "$energy_sum"},
+            "max_energy": {"$max": "$energy_max"},
+            "min_energy": {"$min": "$energy_min"},
+        }}
+    ]
+
+
+def fetch_summary(collection):
+    # Only the single $group document comes back over the wire
+    result = next(rollup_collection(collection).aggregate(summary_pipeline()), None)
+    if not result or not result["total_records"]:
+        return None
+    result.pop("_id", None)
+    result["avg_energy"] = result.pop("energy_sum") / result["total_records"]
+    return result
+
+
+# Latest chart points for the History page
+CHART_PROJECTION = {"date": 1, ENERGY_FIELD: 1, "_id": 0}
+
+
+def fetch_recent_points(collection, limit=7):
+    # Newest first from the timestamp index, returned oldest first for plotting
+    cursor = collection.find({}, CHART_PROJECTION).sort("timestamp", pymongo.DESCENDING).limit(limit)
+    points = [(record.get("date", ""), record.get(ENERGY_FIELD, 0)) for record in cursor]
+    return tuple(reversed(points))
+
+
+# Keyset pagination for the History table, newest first on (timestamp, _id)
+HISTORY_PROJECTION = {
+    "timestamp": 1, "name": 1, "date": 1, "day_of_week": 1, "city": 1,
+    ENERGY_FIELD: 1, "estimated_daily_cost": 1, "estimated_monthly_cost": 1,
+}
+HISTORY_SORT = [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+
+def history_key(record):
+    return (record.get("timestamp"), record["_id"])
+
+
+def history_page_query(direction="first", key=None):
+    # "first"/"after" walk towards older records, "last"/"before" towards newer ones
+    older = direction in ("first", "after")
+    sort = HISTORY_SORT if older else [(field, -order) for field, order in HISTORY_SORT]
+    filter = {}
+    if key is not None and direction in ("after", "before"):
+        timestamp, _id = key
+        op = "$lt" if older else "$gt"
+        filter = {"$or": [{"timestamp": {op: timestamp}}, {"timestamp": timestamp, "_id": {op: _id}}]}
+    return filter, sort
+
+
+def fetch_history_page(collection, page_size, direction="first", key=None):
+    filter, sort = history_page_query(direction, key)
+    records = list(collection.find(filter, HISTORY_PROJECTION).sort(sort).limit(page_size))
+    if direction in ("last", "before"):
+        records.reverse()
+    return records
+
+
+# Export columns: (CSV header, document field, default when missing)
+EXPORT_COLUMNS = [
+    ('Name', 'name', ''),
+    ('Age', 'age', ''),
+    ('City', 'city', ''),
+    ('Area', 'area', ''),
+    ('Date', 'date', ''),
+    ('Day_of_Week', 'day_of_week', ''),
+    ('Lights', 'appliances.light', 0),
+    ('Fans', 'appliances.fans', 0),
+    ('TVs', 'appliances.tv', 0),
+    ('Air_Conditioners', 'appliances.ac', 0),
+    ('Refrigerators', 'appliances.fridge', 0),
+    ('Washing_Machines', 'appliances.washing_machine', 0),
+    ('Energy_kWh_per_day', ENERGY_FIELD, 0),
+    ('Daily_Cost_INR', 'estimated_daily_cost', 0),
+    ('Monthly_Cost_INR', 'estimated_monthly_cost', 0),
+    ('Yearly_Cost_INR', 'estimated_yearly_cost', 0),
+]
+EXPORT_HEADER = [header for header, _, _ in EXPORT_COLUMNS]
+EXPORT_PROJECTION = dict({field: 1 for _, field, _ in EXPORT_COLUMNS}, _id=0)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_WRITE_BUFFER = 1024 * 1024
+
+
+def _field(record, path, default):
+    value = record
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+def iter_export_rows(collection, limit=0, batch_size=EXPORT_BATCH_SIZE):
+    # Rows are produced one at a time from the cursor, never as a full list
+    cursor = collection.find({}, EXPORT_PROJECTION, limit=limit, batch_size=batch_size)
+    for record in cursor:
+        yield [_field(record, path, default) for _, path, default in EXPORT_COLUMNS]
+
+
+def write_export_csv(collection, batch_size=EXPORT_BATCH_SIZE):
+    # Returns an unbuffered (raw) temp file positioned at the start of the CSV;
+    # the CSV is written through a buffer, then only the raw file is kept
+    spool = tempfile.TemporaryFile(mode='w+b', buffering=0)
+    text = io.TextIOWrapper(io.BufferedWriter(spool, EXPORT_WRITE_BUFFER), encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_HEADER)
+    writer.writerows(iter_export_rows(collection, batch_size=batch_size))
+    text.detach().detach()
+    spool.seek(0)
+    return spool
+
+
+# Quick statistics for the Export page, read from the rollups
+def export_stats_pipeline():
+    return [
+        {"$group": {
+            "_id": None,
+            "total_records": {"$sum": "$count"},
+            "first_date": {"$min": "$date"},
+            "last_date": {"$max": "$date"},
+            "total_energy": {"$sum": "$energy_sum"},
+            "total_cost": {"$sum": "$daily_cost_sum"},
+            "cities": {"$addToSet": "$city"},
+        }}
+    ]
+
+
+# Distinct user names counted on the server; only the count comes back.
+# Sorting on name first lets the $group walk the (name, date) index.
+def unique_users_pipeline():
+    return [
+        {"$sort": {"name": 1}},
+        {"$group": {"_id": "$name"}},
+        {"$count": "unique_users"},
+    ]
+
+
+def fetch_export_stats(collection):
+    stats = next(rollup_collection(collection).aggregate(export_stats_pipeline()), None)
+    if not stats or not stats["total_records"]:
+        return None
+    stats.pop("_id", None)
+    stats["unique_cities"] = len(stats.pop("cities"))
+    users = next(collection.aggregate(unique_users_pipeline()), None)
+    stats["unique_users"] = users["unique_users"] if users else 0
+    return stats
+
+
+# Circuit breaker: after repeated connection failures the database is skipped
+# until reset_timeout has passed, then a single trial call is let through
+class CircuitBreaker:
+    def __init__(self, failure_threshold=1, reset_timeout=15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "unknown"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def allow(self):
+        with self._lock:
+            if self.state != "open":
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Trial call; the next one waits for another reset_timeout
+            self._opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        # True when the connection has just come (back) up
+        with self._lock:
+            recovered = self.state != "closed"
+            self.state = "closed"
+            self._failures = 0
+            return recovered
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# Offline spool: records that could not reach MongoDB, one Extended JSON
+# document per line, replayed in bulk once the connection recovers
+class RecordSpool:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.pending = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as spool_file:
+                self.pending = sum(1 for line in spool_file if line.strip())
+
+    def append(self, records):
+        # Returns (record, reason) for the records Extended JSON cannot encode;
+        # those are not written
+        lines, unencodable = [], []
+        for record in records:
+            try:
+                lines.append(json_util.dumps(record) + "\n")
+            except (TypeError, ValueError) as e:
+                unencodable.append((record, e))
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as spool_file:
+                spool_file.writelines(lines)
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            self.pending += len(lines)
+        return unencodable
+
+    def batches(self, batch_size, corrupt=None):
+        # Lines that do not parse (e.g. torn by a crash mid-write) are skipped
+        # and collected in corrupt, so one bad line cannot block the replay
+        batch = []
+        with open(self.path, encoding="utf-8") as spool_file:
+            for line in spool_file:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(json_util.loads(line))
+                except (ValueError, TypeError, BSONError):
+                    if corrupt is not None:
+                        corrupt.append(line)
+                    continue
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    @property
+    def corrupt_path(self):
+        return self.path + ".corrupt"
+
+    def quarantine(self, lines):
+        # Unreadable lines are moved aside as they were, for inspection
+        if not lines:
+            return
+        with self._lock:
+            with open(self.corrupt_path, "a", encoding="utf-8") as corrupt_file:
+                for line in lines:
+                    corrupt_file.write(line.rstrip("\n") + "\n")
+                corrupt_file.flush()
+                os.fsync(corrupt_file.fileno())
+
+    def clear(self):
+        with self._lock:
+            open(self.path, "w").close()
+            self.pending = 0
+
+
+# Records MongoDB refused for good (a value BSON cannot encode, a failed
+# validation), kept one per line with the reason instead of being dropped
+class RejectedRecords:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, rejected):
+        # repr stands in for values that have no Extended JSON form
+        lines = [json_util.dumps({"reason": str(reason), "record": record}, default=repr) + "\n"
+                 for record, reason in rejected]
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as rejected_file:
+                rejected_file.writelines(lines)
+                rejected_file.flush()
+                os.fsync(rejected_file.fileno())
+
+
+# Write-behind buffer: saves are queued and flushed in unordered batches
+
+
+def stamp_inserted(collection, ids):
+    # Server-side insert time for incremental backups. The client "timestamp" is
+    # set when a save is queued and a spooled record may be written much later.
+    # Records stamped by an earlier attempt keep their first stamp.
+    collection.update_many({"_id": {"$in": ids}, INSERTED_AT_FIELD: {"$exists": False}},
+                           {"$currentDate": {INSERTED_AT_FIELD: True}})
+
+
+class WriteBehindBuffer:
+    def __init__(self, collection, max_batch=500, max_delay=1.0, write_concern=None, after_insert=None,
+                 breaker=None, spool=None, rejected=None):
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        self.collection = collection
+        self.after_insert = after_insert
+        self.breaker = breaker
+        self.spool = spool
+        self.rejected = rejected
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._metrics = {
+            "flushes": 0,
+            "records_written": 0,
+            "records_rejected": 0,
+            "last_rejection": "",
+            "records_spooled": 0,
+            "records_replayed": 0,
+            "spool_lines_corrupt": 0,
+            "flush_errors": 0,
+            "after_insert_errors": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="energy-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, record):
+        # A client-side _id makes retries and spool replays idempotent
+        record.setdefault("_id", ObjectId())
+        with self._lock:
+            self._pending.append(record)
+            depth = len(self._pending)
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    @property
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # e.g. the spool cannot be written; the batch stays queued
+                with self._lock:
+                    self._metrics["flush_errors"] += 1
+
+    def _insert(self, batch):
+        # Returns (record, reason) for the records that failed for good
+        errors = []
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+        stamp_inserted(self.collection, [record["_id"] for record in batch])
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+        # A retried batch already carries _ids, so duplicates mean "already written"
+        failed = {error["index"] for error in errors if error.get("code") != DUPLICATE_KEY}
+        hook_failed = False
+        if self.after_insert is not None:
+            # Records written by an earlier attempt are passed on again: the hook
+            # must be idempotent, as apply_rollups is
+            try:
+                self.after_insert([record for i, record in enumerate(batch) if i not in failed])
+            except ConnectionFailure:
+                # The batch is spooled and the hook runs again on the replay
+                raise
+            except Exception:
+                # Rollups can be regenerated with "rebuild-rollups"; never lose the flush thread
+                hook_failed = True
+        with self._lock:
+            self._metrics["after_insert_errors"] += hook_failed
+
+        return [(batch[error["index"]], error.get("errmsg", "write error"))
+                for error in errors if error["index"] in failed]
+
+    def _write(self, batch):
+        # Connection failures are raised so the caller can spool the batch; any other
+        # error is narrowed down to the records causing it, one insert at a time
+        try:
+            return self._insert(batch)
+        except ConnectionFailure:
+            raise
+        except Exception:
+            rejected = []
+            for record in batch:
+                try:
+                    rejected += self._insert([record])
+                except ConnectionFailure:
+                    raise
+                except Exception as e:
+                    rejected.append((record, e))
+            return rejected
+
+    def _reject(self, rejected):
+        if not rejected:
+            return
+        if self.rejected is not None:
+            self.rejected.append(rejected)
+        with self._lock:
+            self._metrics["records_rejected"] += len(rejected)
+            self._metrics["last_rejection"] = str(rejected[-1][1])
+
+    def _park(self, batch):
+        # The database is unreachable: spool the batch, or keep it queued without a spool
+        with self._lock:
+            if self.spool is None:
+                self._pending[:0] = batch
+                self._metrics["flush_errors"] += 1
+                return 0
+        unencodable = self.spool.append(batch)
+        self._reject(unencodable)
+        with self._lock:
+            self._metrics["records_spooled"] += len(batch) - len(unencodable)
+        return len(batch)
+
+    def _replay_spool(self):
+        if self.spool is None or not self.spool.pending:
+            return
+        if self.breaker is not None and not self.breaker.allow():
+            return
+        replayed = 0
+        rejected = []
+        corrupt = []
+        try:
+            for batch in self.spool.batches(self.max_batch, corrupt):
+                rejected += self._write(batch)
+                replayed += len(batch)
+        except ConnectionFailure:
+            # Whatever was inserted is skipped as a duplicate on the next replay
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            return
+        except (PyMongoError, OSError):
+            # The spool is kept for the next flush; the queue is flushed either way
+            with self._lock:
+                self._metrics["flush_errors"] += 1
+            return
+        self._reject(rejected)
+        self.spool.quarantine(corrupt)
+        self.spool.clear()
+        with self._lock:
+            self._metrics["records_replayed"] += replayed - len(rejected)
+            self._metrics["spool_lines_corrupt"] += len(corrupt)
+
+    def flush(self):
+        with self._flush_lock:
+            self._replay_spool()
+            with self._lock:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            if not batch:
+                return 0
+            try:
+                return self._flush_batch(batch)
+            except Exception:
+                # Nothing is lost: the batch goes back to the front of the queue
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+
+    def _flush_batch(self, batch):
+        if self.breaker is not None and not self.breaker.allow():
+            return self._park(batch)
+
+        started = time.perf_counter()
+        try:
+            rejected = self._write(batch)
+        except ConnectionFailure:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            return self._park(batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._reject(rejected)
+
+        with self._lock:
+            metrics = self._metrics
+            metrics["flushes"] += 1
+            metrics["records_written"] += len(batch) - len(rejected)
+            metrics["last_flush_ms"] = elapsed_ms
+            metrics["max_flush_ms"] = max(metrics["max_flush_ms"], elapsed_ms)
+            metrics["total_flush_ms"] += elapsed_ms
+            more = len(self._pending) >= self.max_batch
+        if more:
+            self._wake.set()
+        return len(batch)
+
+    def drain(self):
+        while self.queue_depth and self.flush():
+            pass
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.max_delay + 5)
+        self.drain()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._metrics, queue_depth=len(self._pending))
+        stats["spool_depth"] = self.spool.pending if self.spool is not None else 0
+        stats["circuit"] = self.breaker.state if self.breaker is not None else "n/a"
+        total_ms = stats.pop("total_flush_ms")
+        stats["avg_flush_ms"] = total_ms / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+
+# Query plan diagnostics
+def explain_find(collection, filter=None, sort=None, projection=None):
+    cursor = collection.find(filter or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    return cursor.explain()
+
+
+def explain_aggregate(collection, pipeline):
+    return collection.database.command(
+        "aggregate", collection.name, pipeline=pipeline, explain=True
+    )
+
+
+def plan_stages(explain):
+    # Walk the winning plan only; rejected candidates do not run
+    if isinstance(explain, dict):
+        if "stage" in explain:
+            yield explain["stage"]
+        for key, value in explain.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                yield from plan_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from plan_stages(item)
+
+
+def uses_collscan(explain):
+    return "COLLSCAN" in set(plan_stages(explain))
+
+
+# Command line maintenance: python energy_db.py rebuild-rollups
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Energy tracker database maintenance")
+    parser.add_argument("--uri", help=f"MongoDB URI (default: $ENERGY_TRACKER_MONGO_URI or {MONGO_URI})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-rollups",
+                        help=f"regenerate {ROLLUP_COLLECTION_NAME} from the raw records and verify it; "
+                             "pause writes while it runs")
+    commands.add_parser("verify-rollups", help=f"compare {ROLLUP_COLLECTION_NAME} with the raw records")
+    args = parser.parse_args(argv)
+
+    collection = connect(args.uri)
+    if args.command == "rebuild-rollups":
+        count = rebuild_rollups(collection)
+        print(f"Rebuilt {count} rollup documents")
+
+    mismatches = verify_rollups(collection)
+    for mismatch in mismatches:
+        print(mismatch)
+    print("Rollups match the raw data" if not mismatches else f"{len(mismatches)} rollup mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from energy_charts import TREND_MAX_POINTS, downsample
+
+# Daily entry store for the session-state energy trackers (f5.py, f4_flat_ui.py).
+# Entries are keyed by date, so saving a day is a dict lookup instead of a
+# scan, and each field lives in its own typed NumPy array.
+
+TEXT_FIELDS = ['name', 'city', 'area', 'facility']
+NUMERIC_FIELDS = {
+    'total_energy': np.float64,
+    'base_energy': np.float64,
+    'appliance_energy': np.float64,
+    'cost': np.float64,
+    'carbon_footprint': np.float64,
+    'ac_hours': np.int64,
+    'fridge_efficiency': np.int64,
+    'wm_cycles': np.int64,
+    'lights_hours': np.int64,
+    'fans_hours': np.int64,
+    'tv_hours': np.int64,
+}
+COLUMNS = ['date'] + TEXT_FIELDS + list(NUMERIC_FIELDS)
+MONTHLY_FIELDS = ['total_energy', 'cost', 'carbon_footprint']
+
+
+def date_key(value):
+    return np.datetime64(value, 'D')
+
+
+def month_key(key):
+    return str(key.astype('datetime64[M]'))
+
+
+# Derived history frame and aggregates for one version of a store.
+# Stores that only hold part of the history in memory pass their own aggregates.
+class EnergyHistory:
+    def __init__(self, df, current_month, aggregates=None):
+        self.df = df.sort_values('date', kind='stable').reset_index(drop=True)
+
+        recent = self.df.tail(5)[['date', 'total_energy', 'cost']].copy()
+        recent['date'] = recent['date'].dt.strftime('%Y-%m-%d')
+        self.recent = recent
+
+        if aggregates is None:
+            aggregates = aggregate_history(self.df, current_month)
+        self.count = aggregates['count']
+        self.avg_energy = aggregates['avg_energy']
+        self.total_energy = aggregates['total_energy']
+        self.avg_cost = aggregates['avg_cost']
+        self.total_co2 = aggregates['total_co2']
+        self.monthly_cost = aggregates['monthly_cost']
+        self.projected_bill = aggregates['projected_bill']
+        self._trends = {}
+
+    def trend(self, field='total_energy', max_points=TREND_MAX_POINTS, method='lttb'):
+        # Reduced series for plotting, computed once per store version
+        key = (field, max_points, method)
+        if key not in self._trends:
+            self._trends[key] = downsample(self.df['date'].to_numpy(), self.df[field].to_numpy(),
+                                           max_points, method)
+        return self._trends[key]
+
+
+def aggregate_history(df, current_month):
+    months = df['date'].dt.to_period('M')
+    monthly_cost = df.groupby(months)['cost'].sum().rename_axis('month').reset_index()
+    monthly_cost['month'] = monthly_cost['month'].astype(str)
+    month_cost = df.loc[months == current_month, 'cost']
+    return {
+        'count': len(df),
+        'avg_energy': df['total_energy'].mean(),
+        'total_energy': df['total_energy'].sum(),
+        'avg_cost': df['cost'].mean(),
+        'total_co2': df['carbon_footprint'].sum(),
+        'monthly_cost': monthly_cost,
+        'projected_bill': month_cost.mean() * 30 if not month_cost.empty else None,
+    }
+
+
+class EnergyEntryStore:
+    def __init__(self, capacity=64):
+        self.version = 0
+        self._history = None
+        self._history_key = None
+        self._rows = {}
+        self._months = {}  # 'YYYY-MM' -> running count and sums of MONTHLY_FIELDS
+        self._size = 0
+        self._columns = {'date': np.empty(capacity, dtype='datetime64[ns]')}
+        for field in TEXT_FIELDS:
+            self._columns[field] = np.empty(capacity, dtype=object)
+        for field, dtype in NUMERIC_FIELDS.items():
+            self._columns[field] = np.zeros(capacity, dtype=dtype)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, date):
+        return date_key(date) in self._rows
+
+    def _grow(self):
+        # Doubling keeps appends amortised O(1)
+        for field, values in self._columns.items():
+            grown = np.empty(len(values) * 2, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._columns[field] = grown
+
+    def upsert(self, entry):
+        # Returns True when an entry for that date was replaced
+        key = date_key(entry['date'])
+        row = self._rows.get(key)
+        updated = row is not None
+        if not updated:
+            if self._size == len(self._columns['date']):
+                self._grow()
+            row = self._size
+            self._rows[key] = row
+            self._size += 1
+        else:
+            self._add_to_month(key, row, -1)
+
+        self._columns['date'][row] = key
+        for field in TEXT_FIELDS:
+            self._columns[field][row] = entry.get(field, '')
+        for field in NUMERIC_FIELDS:
+            self._columns[field][row] = entry.get(field, 0)
+        self._add_to_month(key, row, 1)
+        self.version += 1
+        return updated
+
+    def _add_to_month(self, key, row, sign):
+        # O(1) per save: a replaced entry is taken out before the new one goes in
+        month = self._months.setdefault(month_key(key), dict.fromkeys(['count'] + MONTHLY_FIELDS, 0))
+        month['count'] += sign
+        for field in MONTHLY_FIELDS:
+            month[field] += sign * float(self._columns[field][row])
+
+    def get(self, date):
+        row = self._rows.get(date_key(date))
+        if row is None:
+            return None
+        entry = {field: values[row] for field, values in self._columns.items()}
+        entry['date'] = pd.Timestamp(entry['date']).date()
+        return entry
+
+    def frame(self):
+        # Read-only DataFrame over the stored arrays in save order; the date and
+        # numeric columns are not copied
+        data = {}
+        for field in COLUMNS:
+            view = self._columns[field][:self._size]
+            view.flags.writeable = False
+            data[field] = view
+        return pd.DataFrame(data, copy=False)
+
+    def monthly_aggregates(self):
+        # Count, sum and mean of MONTHLY_FIELDS per month, from the running totals
+        rows = []
+        for month, totals in sorted(self._months.items()):
+            row = {'month': month, 'count': totals['count']}
+            for field in MONTHLY_FIELDS:
+                row[f'{field}_sum'] = totals[field]
+                row[f'{field}_mean'] = totals[field] / totals['count']
+            rows.append(row)
+        columns = ['month', 'count'] + [f'{field}_{stat}' for field in MONTHLY_FIELDS for stat in ('sum', 'mean')]
+        return pd.DataFrame(rows, columns=columns)
+
+    def aggregates(self, current_month):
+        # Same figures as aggregate_history, without touching the entries
+        count = self._size
+        totals = {field: math.fsum(month[field] for month in self._months.values()) for field in MONTHLY_FIELDS}
+        monthly = self.monthly_aggregates()
+        current = self._months.get(str(current_month))
+        return {
+            'count': count,
+            'avg_energy': totals['total_energy'] / count if count else float('nan'),
+            'total_energy': totals['total_energy'],
+            'avg_cost': totals['cost'] / count if count else float('nan'),
+            'total_co2': totals['carbon_footprint'],
+            'monthly_cost': monthly[['month', 'cost_sum']].rename(columns={'cost_sum': 'cost'}),
+            'projected_bill': current['cost'] / current['count'] * 30 if current else None,
+        }
+
+    def verify_aggregates(self):
+        # Compares the running monthly totals with a full recomputation
+        df = self.frame()
+        months = df['date'].dt.to_period('M').astype(str)
+        expected = df.groupby(months)[MONTHLY_FIELDS].agg(['sum', 'count'])
+        mismatches = []
+        for month in sorted(set(expected.index) | set(self._months)):
+            totals = self._months.get(month)
+            if month not in expected.index or totals is None:
+                mismatches.append(f"{month}: present in only one of running totals and entries")
+                continue
+            if totals['count'] != expected.loc[month, ('cost', 'count')]:
+                mismatches.append(f"{month}: count is {totals['count']}, "
+                                  f"entries give {expected.loc[month, ('cost', 'count')]}")
+            for field in MONTHLY_FIELDS:
+                # Running sums add and subtract in save order, so allow rounding noise
+                if not math.isclose(totals[field], expected.loc[month, (field, 'sum')], rel_tol=1e-9, abs_tol=1e-6):
+                    mismatches.append(f"{month}: {field} is {totals[field]}, "
+                                      f"entries give {expected.loc[month, (field, 'sum')]}")
+        return mismatches
+
+    def history(self):
+        # Recomputed only after a save (or when the calendar month rolls over)
+        key = (self.version, pd.Timestamp.today().to_period('M'))
+        if self._history_key != key:
+            self._history = EnergyHistory(self.frame(), key[1], self.aggregates(key[1]))
+            self._history_key = key
+        return self._history
@@ -0,0 +1,127 @@
+# Download formats for the session-state energy history (f5.py).
+#
+#   python energy_export.py --days 365   # payload size and serialization time per format
+#
+# Files are built only when a download is requested. Parquet and Feather need
+# pyarrow; without it only gzip CSV is offered.
+
+import argparse
+import gzip
+import importlib.util
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from energy_entries import COLUMNS
+from energy_model import HOURLY_MODEL
+
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def _parquet(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, engine="pyarrow", compression="zstd", index=False)
+    return buffer.getvalue()
+
+
+def _feather(df):
+    # Arrow IPC file with zstd-compressed buffers; loads without any parsing
+    buffer = io.BytesIO()
+    df.reset_index(drop=True).to_feather(buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def _csv_gzip(df):
+    # mtime=0 so the same data always gives the same bytes
+    return gzip.compress(df.to_csv(index=False).encode("utf-8"), compresslevel=6, mtime=0)
+
+
+# Format name -> (label, file extension, MIME type, writer)
+EXPORT_FORMATS = {
+    "parquet": ("Parquet (zstd)", "parquet", "application/vnd.apache.parquet", _parquet),
+    "feather": ("Arrow IPC / Feather (zstd)", "arrow", "application/vnd.apache.arrow.file", _feather),
+    "csv.gz": ("CSV (gzip)", "csv.gz", "application/gzip", _csv_gzip),
+}
+ARROW_FORMATS = ("parquet", "feather")
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if ARROW_AVAILABLE or fmt not in ARROW_FORMATS]
+
+
+def filter_entries(df, columns=None, start=None, end=None):
+    # Rows with start <= date <= end (either bound optional), then the chosen columns in table order
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (df['date'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (df['date'] <= pd.Timestamp(end)).to_numpy()
+    if columns:
+        df = df[[column for column in df.columns if column in columns]]
+    return df[mask]
+
+
+def export_entries(df, fmt, columns=None, start=None, end=None):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {list(EXPORT_FORMATS)}")
+    if fmt in ARROW_FORMATS and not ARROW_AVAILABLE:
+        raise RuntimeError(f"The {fmt} export needs pyarrow (pip install pyarrow)")
+    return EXPORT_FORMATS[fmt][3](filter_entries(df, columns, start, end))
+
+
+def export_file_name(fmt, prefix="energy_data"):
+    return f"{prefix}.{EXPORT_FORMATS[fmt][1]}"
+
+
+# Benchmark: a year of synthetic daily entries per user
+def sample_entries(days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    inputs = {
+        'ac_hours': rng.integers(0, 13, days),
+        'fridge_efficiency': np.full(days, 3),
+        'wm_cycles': rng.integers(0, 3, days),
+        'lights_hours': rng.integers(0, 13, days),
+        'fans_hours': rng.integers(0, 13, days),
+        'tv_hours': rng.integers(0, 13, days),
+    }
+    energy = HOURLY_MODEL.evaluate_batch(np.full(days, "2BHK"), **inputs)
+    df = pd.DataFrame({
+        'date': pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq="D"),
+        'name': "Asha", 'city': "Pune", 'area': "Kothrud", 'facility': "2BHK", **energy, **inputs,
+    })
+    return df[COLUMNS]
+
+
+def benchmark(days=365, repeat=20):
+    df = sample_entries(days)
+    writers = [("CSV (uncompressed, previous export)", lambda df: df.to_csv(index=False).encode("utf-8"))]
+    writers += [(EXPORT_FORMATS[fmt][0], EXPORT_FORMATS[fmt][3]) for fmt in available_formats()]
+    rows = []
+    for label, writer in writers:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            payload = writer(df)
+            timings.append(time.perf_counter() - started)
+        rows.append({'format': label, 'bytes': len(payload), 'ms': min(timings) * 1000})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare export payload size and serialization time")
+    parser.add_argument("--days", type=int, default=365, help="daily entries in the sample history (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per format; the best is reported (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.days, args.repeat)
+    print(f"{args.days} daily entries")
+    for row in results.itertuples():
+        print(f"  {row.format:<38} {row.bytes:>9,} bytes  {row.ms:7.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Household energy models shared by the tracker front ends.
+#
+#   python energy_model.py   # batched vs per-household throughput
+#
+# light_cal_ui.py scores appliance counts (ENERGY_RATES below). f4_flat.py,
+# f4_flat_ui.py and f5.py use an EnergyModel: a home-size baseline plus one
+# term per input, declared as data and compiled to NumPy arrays once.
+
+# kWh per day for one appliance of each kind
+ENERGY_RATES = {
+    'light': 0.2,
+    'fans': 0.2,
+    'tv': 0.3,
+    'ac': 3.0,
+    'fridge': 3.1,
+    'washing_machine': 2.8
+}
+APPLIANCES = list(ENERGY_RATES)
+
+RATE_PER_UNIT = 8  # ₹ per kWh
+DAYS_PER_MONTH = 30
+DAYS_PER_YEAR = 365
+
+# Column names used by the Export page, accepted as aliases in bulk input
+APPLIANCE_ALIASES = {
+    'Lights': 'light',
+    'Fans': 'fans',
+    'TVs': 'tv',
+    'Air_Conditioners': 'ac',
+    'Refrigerators': 'fridge',
+    'Washing_Machines': 'washing_machine'
+}
+
+# Rates in hundredths of a kWh, so bulk sums are exact integers
+_RATE_HUNDREDTHS = np.array([round(ENERGY_RATES[name] * 100) for name in APPLIANCES], dtype=np.int64)
+
+
+# Energy calculation function
+def calculate_energy(appliances):
+    total_energy = 0
+    for appliance, count in appliances.items():
+        if count > 0:
+            total_energy += count * ENERGY_RATES[appliance]
+
+    return round(total_energy, 2)
+
+
+# Daily, monthly and yearly cost for one household
+def calculate_costs(total_energy):
+    daily_cost = round(total_energy * RATE_PER_UNIT, 2)
+    monthly_cost = round(daily_cost * DAYS_PER_MONTH, 2)
+    yearly_cost = round(daily_cost * DAYS_PER_YEAR, 2)
+    return daily_cost, monthly_cost, yearly_cost
+
+
+def _count_matrix(counts):
+    if isinstance(counts, pd.DataFrame):
+        frame = counts.rename(columns=APPLIANCE_ALIASES)
+        missing = [name for name in APPLIANCES if name not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing appliance columns: {', '.join(missing)}")
+        matrix = frame[APPLIANCES].fillna(0).to_numpy(dtype=np.float64)
+    else:
+        matrix = np.asarray(counts, dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[1] != len(APPLIANCES):
+            raise ValueError(f"Expected an (n, {len(APPLIANCES)}) count matrix in the order {APPLIANCES}")
+
+    if not np.all(np.isfinite(matrix)) or not np.all(matrix == np.floor(matrix)):
+        raise ValueError("Appliance counts must be whole numbers")
+    # calculate_energy ignores zero and negative counts
+    return np.clip(matrix, 0, None).astype(np.int64)
+
+
+# Bulk scoring: one matrix-vector product over every household
+def calculate_energy_bulk(counts):
+    matrix = _count_matrix(counts)
+
+    # Integer hundredths keep every row identical to calculate_energy/calculate_costs
+    energy = matrix @ _RATE_HUNDREDTHS
+    daily_cost = energy * RATE_PER_UNIT
+
+    index = counts.index if isinstance(counts, pd.DataFrame) else None
+    return pd.DataFrame({
+        'energy_kwh_per_day': energy / 100,
+        'estimated_daily_cost': daily_cost / 100,
+        'estimated_monthly_cost': daily_cost * DAYS_PER_MONTH / 100,
+        'estimated_yearly_cost': daily_cost * DAYS_PER_YEAR / 100
+    }, index=index)
+
+
+# Home-size baselines and per-input terms, compiled to arrays. A term is either
+# a linear rate (kWh per hour or cycle) or a lookup table from an integer level
+# to kWh; levels missing from the table contribute nothing. Terms are added in
+# declaration order, so a batch gives bit-for-bit the same values as the
+# front ends' original scalar arithmetic.
+class EnergyModel:
+    def __init__(self, baseline, terms, cost_per_kwh, co2_per_kwh):
+        self.sizes = list(baseline)
+        self.baseline = np.array([baseline[size] for size in self.sizes], dtype=np.float64)
+        self.inputs = [name for name, _, _ in terms]
+        self.labels = {name: label for name, label, _ in terms}
+        self.rates = {}
+        self.tables = {}
+        for name, _, coefficient in terms:
+            if isinstance(coefficient, dict):
+                table = np.zeros(max(coefficient) + 1)
+                for level, kwh in coefficient.items():
+                    table[level] = kwh
+                self.tables[name] = table
+            else:
+                self.rates[name] = coefficient
+        self.cost_per_kwh = cost_per_kwh
+        self.co2_per_kwh = co2_per_kwh
+
+    def size_codes(self, sizes):
+        sizes = np.atleast_1d(sizes)
+        if np.issubdtype(sizes.dtype, np.integer):
+            codes = sizes
+        else:
+            codes = pd.Categorical(sizes, categories=self.sizes).codes
+        if len(codes) and (codes.min() < 0 or codes.max() >= len(self.sizes)):
+            raise ValueError(f"Unknown home size, expected one of {self.sizes}")
+        return codes
+
+    def term_energy(self, name, values):
+        values = np.asarray(values)
+        table = self.tables.get(name)
+        if table is None:
+            return values * self.rates[name]
+        if values.size and (values.min() < 0 or values.max() >= len(table)):
+            raise ValueError(f"{name} levels must be between 0 and {len(table) - 1}")
+        return table[values]
+
+    def evaluate_batch(self, sizes, breakdown=False, **inputs):
+        # sizes: home-size labels or their codes; inputs: one array (or scalar) per term
+        base = self.baseline[self.size_codes(sizes)]
+        appliance = np.zeros(len(base))
+        terms = {}
+        for name in self.inputs:
+            energy = self.term_energy(name, inputs.get(name, 0))
+            if breakdown:
+                terms[name] = np.broadcast_to(energy, base.shape)
+            appliance = appliance + energy
+        total_energy = base + appliance
+        result = {
+            'base_energy': base,
+            'appliance_energy': appliance,
+            'total_energy': total_energy,
+            'cost': total_energy * self.cost_per_kwh,
+            'carbon_footprint': total_energy * self.co2_per_kwh,
+        }
+        if breakdown:
+            result['breakdown'] = terms
+        return result
+
+    def evaluate(self, size, **inputs):
+        # One household: the batch path on a single row, returned as plain floats
+        if size not in self.sizes:
+            raise ValueError(f"Unknown home size {size!r}, expected one of {self.sizes}")
+        batch = self.evaluate_batch([self.sizes.index(size)], breakdown=True,
+                                    **{name: [value] for name, value in inputs.items()})
+        result = {key: float(values[0]) for key, values in batch.items() if key != 'breakdown'}
+        result['breakdown'] = {self.labels[name]: float(values[0]) for name, values in batch['breakdown'].items()}
+        return result
+
+
+CO2_PER_KWH = 0.82  # kg CO2 per kWh
+FRIDGE_FACTOR = {1: 0.2, 2: 0.18, 3: 0.15, 4: 0.12, 5: 0.1}  # kWh per hour by efficiency rating
+
+# Hourly usage model (f4_flat_ui.py, f5.py): lights and fans baseline by home
+# size, appliances by hours or cycles used. A fridge efficiency of 0 means no fridge.
+HOURLY_MODEL = EnergyModel(
+    baseline={"1BHK": 2 * 0.4 + 2 * 0.8, "2BHK": 3 * 0.4 + 3 * 0.8, "3BHK": 4 * 0.4 + 4 * 0.8},
+    terms=[
+        ('ac_hours', "AC", 1.5),
+        ('fridge_efficiency', "Fridge", {level: 24 * factor for level, factor in FRIDGE_FACTOR.items()}),
+        ('wm_cycles', "Washing Machine", 2),
+        ('lights_hours', "Lights", 0.06),
+        ('fans_hours', "Fans", 0.075),
+        ('tv_hours', "TV", 0.15),
+    ],
+    cost_per_kwh=5,
+    co2_per_kwh=CO2_PER_KWH,
+)
+
+# Appliance checklist model (f4_flat.py): a flat adds the lights and fans
+# baseline, each appliance owned adds a fixed 3 kWh
+CHECKLIST_MODEL = EnergyModel(
+    baseline={"1BHK": 2 * 0.4 + 2 * 0.8, "2BHK": 2 * 0.4 + 2 * 0.8, "3BHK": 2 * 0.4 + 2 * 0.8, "Tenement": 0},
+    terms=[
+        ('ac', "AC", 3),
+        ('fridge', "Fridge", 3),
+        ('washing_machine', "Washing Machine", 3),
+    ],
+    cost_per_kwh=RATE_PER_UNIT,
+    co2_per_kwh=CO2_PER_KWH,
+)
+
+
+# Benchmark: random household-days through the batch and the scalar path
+def random_household_days(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, len(HOURLY_MODEL.sizes), count), {
+        'ac_hours': rng.integers(0, 25, count),
+        'fridge_efficiency': rng.integers(0, 6, count),
+        'wm_cycles': rng.integers(0, 6, count),
+        'lights_hours': rng.integers(0, 25, count),
+        'fans_hours': rng.integers(0, 25, count),
+        'tv_hours': rng.integers(0, 25, count),
+    }
+
+
+def benchmark(count=5_000_000, scalar_count=20_000):
+    sizes, inputs = random_household_days(count)
+    started = time.perf_counter()
+    batch = HOURLY_MODEL.evaluate_batch(sizes, **inputs)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for row in range(scalar_count):
+        result = HOURLY_MODEL.evaluate(HOURLY_MODEL.sizes[sizes[row]],
+                                       **{name: int(values[row]) for name, values in inputs.items()})
+        for key in ('base_energy', 'appliance_energy', 'total_energy', 'cost', 'carbon_footprint'):
+            if result[key] != batch[key][row]:
+                raise AssertionError(f"row {row}: scalar {key} {result[key]} != batch {batch[key][row]}")
+    scalar_seconds = time.perf_counter() - started
+    return count / batch_seconds, scalar_count / scalar_seconds
+
+
+def main():
+    batch_rate, scalar_rate = benchmark()
+    print(f"batch:  {batch_rate:,.0f} household-days/s")
+    print(f"scalar: {scalar_rate:,.0f} household-days/s (identical results on every row checked)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from energy_model import HOURLY_MODEL
+
+# What-if savings search for the Smart Energy Consumption Tracker (f5.py).
+# Every combination of appliance settings is evaluated at once: each setting
+# contributes an independent term, so the energy and comfort-cost grids are
+# sums of 1-D arrays broadcast over one axis per setting.
+
+# One axis per input of the f5.py energy model, and the values searched on it
+SETTINGS = HOURLY_MODEL.inputs
+SETTING_VALUES = {
+    'ac_hours': np.arange(25),
+    'fridge_efficiency': np.arange(1, 6),
+    'wm_cycles': np.arange(6),
+    'lights_hours': np.arange(25),
+    'fans_hours': np.arange(25),
+    'tv_hours': np.arange(25),
+}
+
+# Comfort points given up per hour (or cycle) below the current setting, and
+# per fridge efficiency level bought above the current one
+COMFORT_WEIGHTS = {
+    'ac_hours': 1.0,
+    'fridge_efficiency': 2.0,
+    'wm_cycles': 1.5,
+    'lights_hours': 0.8,
+    'fans_hours': 0.6,
+    'tv_hours': 0.4,
+}
+COMFORT_SCALE = 10  # comfort costs are kept in tenths of a point, as integers
+
+
+def _broadcast_sum(terms, dtype):
+    # terms[i] varies along axis i only; the running sum grows one axis at a time
+    total = np.zeros((), dtype=dtype)
+    for axis, term in enumerate(terms):
+        shape = [1] * len(terms)
+        shape[axis] = len(term)
+        total = total + term.astype(dtype).reshape(shape)
+    return total
+
+
+# Appliance energy (kWh/day, without the base load) for every combination of settings
+class SavingsGrid:
+    def __init__(self, has_fridge=True):
+        self.has_fridge = has_fridge
+        self.values = dict(SETTING_VALUES)
+        if not has_fridge:
+            # Without a fridge its efficiency is irrelevant; search a single value
+            self.values['fridge_efficiency'] = np.array([0])
+        self.energy = _broadcast_sum(
+            [HOURLY_MODEL.term_energy(setting, self.values[setting]) for setting in SETTINGS], np.float32)
+        self.shape = self.energy.shape
+        self.size = self.energy.size
+
+    def comfort_cost(self, current, weights=COMFORT_WEIGHTS):
+        # Only cutting usage (or upgrading the fridge) costs comfort
+        terms = []
+        for setting in SETTINGS:
+            values = self.values[setting]
+            if setting == 'fridge_efficiency':
+                change = np.clip(values - current.get(setting, 0), 0, None) if self.has_fridge else np.zeros(1)
+            else:
+                change = np.clip(current.get(setting, 0) - values, 0, None)
+            terms.append(np.round(change * weights[setting] * COMFORT_SCALE))
+        return _broadcast_sum(terms, np.int16)
+
+    def current_energy(self, current):
+        # Appliance energy of the current settings, as f5.py computes it
+        total = 0
+        for setting in SETTINGS:
+            value = current.get(setting, 0) if setting != 'fridge_efficiency' or self.has_fridge else 0
+            total = total + HOURLY_MODEL.term_energy(setting, value)
+        return float(total)
+
+    def configurations(self, flat_indices, current, comfort):
+        settings = np.unravel_index(flat_indices, self.shape)
+        energy = self.energy.ravel()[flat_indices].astype(np.float64)
+        # float32 grid sums: round away the last-digit noise (and -0.0)
+        saved = (self.current_energy(current) - energy).round(3) + 0.0
+        frame = pd.DataFrame({setting: self.values[setting][index] for setting, index in zip(SETTINGS, settings)})
+        frame.insert(0, 'comfort_cost', comfort.ravel()[flat_indices] / COMFORT_SCALE)
+        frame.insert(1, 'saved_kwh', saved)
+        frame.insert(2, 'saved_cost_per_day', (saved * HOURLY_MODEL.cost_per_kwh).round(2))
+        if not self.has_fridge:
+            frame = frame.drop(columns='fridge_efficiency')
+        return frame
+
+    # Configurations saving the most energy within a comfort-cost budget; only
+    # those using less than the current settings, so the result may be empty
+    def best(self, current, max_comfort_cost, top=10, weights=COMFORT_WEIGHTS):
+        comfort = self.comfort_cost(current, weights)
+        # The margin keeps float32 rounding of the current settings themselves out
+        saves_energy = self.energy < np.float32(self.current_energy(current) - 1e-4)
+        feasible = (comfort <= max_comfort_cost * COMFORT_SCALE) & saves_energy
+        energy = np.where(feasible, self.energy, np.float32(np.inf)).ravel()
+        top = min(top, energy.size)
+        candidates = np.argpartition(energy, top - 1)[:top]
+        candidates = candidates[np.isfinite(energy[candidates])]
+        order = np.lexsort((comfort.ravel()[candidates], energy[candidates]))
+        return self.configurations(candidates[order], current, comfort)
+
+    # Cheapest comfort cost for each achievable saving: no configuration on the
+    # front is beaten on both energy and comfort by another one
+    def pareto_front(self, current, weights=COMFORT_WEIGHTS):
+        comfort = self.comfort_cost(current, weights).ravel()
+        energy = self.energy.ravel()
+
+        # Lowest energy for each comfort-cost value
+        lowest = np.full(int(comfort.max()) + 1, np.inf, dtype=np.float32)
+        np.minimum.at(lowest, comfort, energy)
+        costs = np.flatnonzero(np.isfinite(lowest))
+        # Keep a cost only if it buys less energy than every cheaper cost
+        previous_best = np.minimum.accumulate(np.r_[np.inf, lowest[costs][:-1]])
+        costs = costs[lowest[costs] < previous_best]
+
+        # One configuration per front point
+        on_front = np.zeros(len(lowest), dtype=bool)
+        on_front[costs] = True
+        matches = np.flatnonzero(on_front[comfort] & (energy == lowest[comfort]))
+        _, first = np.unique(comfort[matches], return_index=True)
+        return self.configurations(matches[first], current, comfort.reshape(self.shape))
@@ -0,0 +1,233 @@
+# Process-wide energy store shared by every Streamlit session (f4_flat_ui.py).
+#
+#   python energy_shared.py --threads 300 --saves 200   # concurrent writer stress test
+#
+# Every user's EnergyEntryStore has its own lock, so saves and history reads
+# for different users never wait on each other. Running per-area totals are
+# spread over a fixed set of stripes by user name hash. A save updates its
+# stripe's totals while it still holds the user's lock, so the locks are always
+# taken user first, then stripe. Cross-household queries visit the stripes one
+# at a time. A history is built from a copy of the user's entries taken under
+# the lock; the sort and aggregation run outside it.
+
+import argparse
+import datetime
+import math
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from energy_entries import EnergyEntryStore, EnergyHistory
+
+STRIPES = 64
+AREA_FIELDS = ['total_energy', 'cost']
+
+
+class _Stripe:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.areas = {}  # area -> running entry count, sums of AREA_FIELDS and entries per household
+
+    def add_to_area(self, name, entry, sign):
+        area = self.areas.setdefault(entry['area'], {'count': 0, 'households': {}, **dict.fromkeys(AREA_FIELDS, 0.0)})
+        area['count'] += sign
+        for field in AREA_FIELDS:
+            area[field] += sign * float(entry[field])
+        households = area['households']
+        households[name] = households.get(name, 0) + sign
+        if not households[name]:
+            del households[name]
+
+
+class _User:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.store = EnergyEntryStore()
+        self.history = None
+        self.history_key = None
+
+
+class SharedEnergyStore:
+    def __init__(self, stripes=STRIPES):
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._users = {}
+        self._users_lock = threading.Lock()  # only taken to add a user
+
+    def _stripe(self, name):
+        return self._stripes[hash(name) % len(self._stripes)]
+
+    def _user(self, name, create=False):
+        user = self._users.get(name)
+        if user is None and create:
+            with self._users_lock:
+                user = self._users.setdefault(name, _User())
+        return user
+
+    def upsert(self, name, entry):
+        # Returns True when an entry for that date was replaced
+        user = self._user(name, create=True)
+        stripe = self._stripe(name)
+        with user.lock:
+            previous = user.store.get(entry['date'])
+            updated = user.store.upsert(entry)
+            current = user.store.get(entry['date'])
+            with stripe.lock:
+                if previous is not None:
+                    stripe.add_to_area(name, previous, -1)
+                stripe.add_to_area(name, current, 1)
+            return updated
+
+    def count(self, name):
+        user = self._user(name)
+        if user is None:
+            return 0
+        with user.lock:
+            return len(user.store)
+
+    def history(self, name):
+        user = self._user(name)
+        if user is None:
+            return None
+        month = pd.Timestamp.today().to_period('M')
+        with user.lock:
+            key = (user.store.version, month)
+            if user.history_key == key:
+                return user.history
+            # The store's arrays are updated in place, so take a copy to build from
+            df = user.store.frame().copy()
+            aggregates = user.store.aggregates(month)
+        history = EnergyHistory(df, month, aggregates)
+        with user.lock:
+            # Keep it unless a newer version was cached meanwhile
+            if user.history_key is None or user.history_key[0] <= key[0]:
+                user.history, user.history_key = history, key
+        return history
+
+    def area_summaries(self):
+        # Entries, households and averages per area, across every user
+        totals = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for area, values in stripe.areas.items():
+                    if not values['count']:
+                        continue
+                    combined = totals.setdefault(area, {'count': 0, 'households': 0, **dict.fromkeys(AREA_FIELDS, 0.0)})
+                    combined['count'] += values['count']
+                    combined['households'] += len(values['households'])
+                    for field in AREA_FIELDS:
+                        combined[field] += values[field]
+        rows = [{
+            'area': area,
+            'households': values['households'],
+            'entries': values['count'],
+            'avg_energy': values['total_energy'] / values['count'],
+            'avg_cost': values['cost'] / values['count'],
+        } for area, values in sorted(totals.items())]
+        return pd.DataFrame(rows, columns=['area', 'households', 'entries', 'avg_energy', 'avg_cost'])
+
+    def area_summary(self, area):
+        summaries = self.area_summaries()
+        match = summaries[summaries['area'] == area]
+        return match.iloc[0].to_dict() if not match.empty else None
+
+
+# One session's view of a user in the shared store, used as st.session_state.energy_data
+class SharedUserStore:
+    def __init__(self, shared, name):
+        self.shared = shared
+        self.name = name
+
+    def __len__(self):
+        return self.shared.count(self.name)
+
+    def upsert(self, entry):
+        return self.shared.upsert(self.name, entry)
+
+    def history(self):
+        return self.shared.history(self.name)
+
+
+# Stress test: concurrent writers, then check that no save was lost
+def stress_test(threads=300, saves=200, users=100, areas=7, stripes=STRIPES):
+    shared = SharedEnergyStore(stripes)
+    start = datetime.date(2020, 1, 1)
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def writer(number):
+        # Threads sharing a user write disjoint dates; each date is saved twice
+        # so replacements are exercised too, and the second value is kept
+        name = f"user-{number % users}"
+        area = f"area-{number % users % areas}"
+        first_day = (number // users) * saves
+        barrier.wait()
+        try:
+            for repeat in (0, 1):
+                for day in range(saves):
+                    energy = float(number + day + repeat)
+                    shared.upsert(name, {
+                        'date': start + datetime.timedelta(days=first_day + day), 'name': name, 'area': area,
+                        'total_energy': energy, 'cost': energy * 5, 'carbon_footprint': energy * 0.82,
+                    })
+        except Exception as e:
+            errors.append(e)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible to shake out races
+    started = time.perf_counter()
+    try:
+        workers = [threading.Thread(target=writer, args=(number,)) for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    elapsed = time.perf_counter() - started
+
+    problems = [f"writer failed: {error!r}" for error in errors]
+    expected_count = {}
+    expected_energy = {}
+    for number in range(threads):
+        name = f"user-{number % users}"
+        expected_count[name] = expected_count.get(name, 0) + saves
+        expected_energy[name] = expected_energy.get(name, 0.0) + sum(float(number + day + 1) for day in range(saves))
+
+    for name, count in expected_count.items():
+        history = shared.history(name)
+        if shared.count(name) != count:
+            problems.append(f"{name}: {shared.count(name)} entries, expected {count}")
+        elif not math.isclose(history.total_energy, expected_energy[name], rel_tol=1e-9):
+            problems.append(f"{name}: total energy {history.total_energy}, expected {expected_energy[name]}")
+
+    summaries = shared.area_summaries()
+    if summaries['entries'].sum() != sum(expected_count.values()):
+        problems.append(f"area totals hold {summaries['entries'].sum()} entries, expected {sum(expected_count.values())}")
+    if summaries['households'].sum() != len(expected_count):
+        problems.append(f"area totals hold {summaries['households'].sum()} households, expected {len(expected_count)}")
+    area_energy = (summaries['avg_energy'] * summaries['entries']).sum()
+    if not math.isclose(area_energy, sum(expected_energy.values()), rel_tol=1e-9):
+        problems.append(f"area totals hold {area_energy} kWh, expected {sum(expected_energy.values())}")
+    return threads * saves * 2, elapsed, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress test the shared energy store with concurrent writers")
+    parser.add_argument("--threads", type=int, default=300, help="writer threads (default: %(default)s)")
+    parser.add_argument("--saves", type=int, default=200, help="dates saved twice by each thread (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=100, help="distinct users written to (default: %(default)s)")
+    parser.add_argument("--stripes", type=int, default=STRIPES, help="area total stripes (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    total, elapsed, problems = stress_test(args.threads, args.saves, args.users, stripes=args.stripes)
+    print(f"{total} saves from {args.threads} threads in {elapsed:.2f} s ({total / elapsed:,.0f} saves/s)")
+    for problem in problems:
+        print(f"  {problem}")
+    print("Lost updates found" if problems else "No lost updates")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
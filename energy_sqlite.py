@@ -0,0 +1,355 @@
+import contextlib
+import math
+import os
+import queue
+import sqlite3
+
+import pandas as pd
+
+from energy_entries import (COLUMNS, MONTHLY_FIELDS, NUMERIC_FIELDS, TEXT_FIELDS, EnergyEntryStore,
+                            EnergyHistory, aggregate_history)
+
+# Optional persistent storage for the session-state energy trackers
+# (f5.py, f4_flat_ui.py). Set ENERGY_TRACKER_SQLITE to a database file path
+# to enable it; every session then shares the same history across restarts.
+
+SQLITE_PATH_SETTING = "ENERGY_TRACKER_SQLITE"
+PAGE_SIZE = 90  # days loaded per history page
+POOL_SIZE = 8   # idle connections kept open for reuse
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS energy_entries (
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    city TEXT,
+    area TEXT,
+    facility TEXT,
+    total_energy REAL,
+    base_energy REAL,
+    appliance_energy REAL,
+    cost REAL,
+    carbon_footprint REAL,
+    ac_hours INTEGER,
+    fridge_efficiency INTEGER,
+    wm_cycles INTEGER,
+    lights_hours INTEGER,
+    fans_hours INTEGER,
+    tv_hours INTEGER,
+    PRIMARY KEY (name, date)
+) WITHOUT ROWID
+"""
+
+# Running totals, kept by triggers so every writer (any session or process)
+# updates them in the same transaction as the entry: per user and month the
+# entry count and the sums of MONTHLY_FIELDS, and per user a change counter
+# that history caches are keyed on.
+MONTHLY_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS energy_monthly (
+    name TEXT NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    {', '.join(f'{field} REAL NOT NULL' for field in MONTHLY_FIELDS)},
+    PRIMARY KEY (name, month)
+) WITHOUT ROWID
+"""
+VERSIONS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS energy_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def _add_month_sql(row):
+    values = ', '.join(f'IFNULL({row}.{field}, 0)' for field in MONTHLY_FIELDS)
+    updates = ', '.join(f'{field} = {field} + excluded.{field}' for field in MONTHLY_FIELDS)
+    return (f"INSERT INTO energy_monthly (name, month, count, {', '.join(MONTHLY_FIELDS)}) "
+            f"VALUES ({row}.name, substr({row}.date, 1, 7), 1, {values}) "
+            f"ON CONFLICT (name, month) DO UPDATE SET count = count + 1, {updates};")
+
+
+def _remove_month_sql(row):
+    # A month whose last entry goes is dropped, which also clears rounding drift
+    updates = ', '.join(f'{field} = {field} - IFNULL({row}.{field}, 0)' for field in MONTHLY_FIELDS)
+    where = f"WHERE name = {row}.name AND month = substr({row}.date, 1, 7)"
+    return (f"UPDATE energy_monthly SET count = count - 1, {updates} {where}; "
+            f"DELETE FROM energy_monthly {where} AND count = 0;")
+
+
+def _bump_version_sql(row):
+    return (f"INSERT INTO energy_versions (name, version) VALUES ({row}.name, 1) "
+            f"ON CONFLICT (name) DO UPDATE SET version = version + 1;")
+
+
+TRIGGERS_SQL = [
+    "CREATE TRIGGER IF NOT EXISTS energy_entries_insert AFTER INSERT ON energy_entries BEGIN "
+    f"{_add_month_sql('NEW')} {_bump_version_sql('NEW')} END",
+    "CREATE TRIGGER IF NOT EXISTS energy_entries_update AFTER UPDATE ON energy_entries BEGIN "
+    f"{_remove_month_sql('OLD')} {_add_month_sql('NEW')} {_bump_version_sql('NEW')} END",
+    "CREATE TRIGGER IF NOT EXISTS energy_entries_delete AFTER DELETE ON energy_entries BEGIN "
+    f"{_remove_month_sql('OLD')} {_bump_version_sql('OLD')} END",
+]
+
+# Databases created before the running totals get them built once from the entries
+BACKFILL_SQL = [
+    f"INSERT INTO energy_monthly (name, month, count, {', '.join(MONTHLY_FIELDS)}) "
+    f"SELECT name, substr(date, 1, 7), COUNT(*), {', '.join(f'TOTAL({field})' for field in MONTHLY_FIELDS)} "
+    "FROM energy_entries GROUP BY name, substr(date, 1, 7)",
+    "INSERT INTO energy_versions (name, version) SELECT DISTINCT name, 1 FROM energy_entries",
+]
+
+# Fixed statement text, so sqlite3 reuses each compiled statement from its
+# per-connection cache instead of preparing it again
+DATA_FIELDS = [field for field in COLUMNS if field not in ('name', 'date')]
+UPSERT_SQL = (
+    f"INSERT INTO energy_entries (name, date, {', '.join(DATA_FIELDS)}) "
+    f"VALUES (?, ?, {', '.join('?' for _ in DATA_FIELDS)}) "
+    f"ON CONFLICT (name, date) DO UPDATE SET "
+    + ", ".join(f"{field} = excluded.{field}" for field in DATA_FIELDS)
+)
+EXISTS_SQL = "SELECT 1 FROM energy_entries WHERE name = ? AND date = ?"
+PAGE_SQL = (
+    f"SELECT {', '.join(COLUMNS)} FROM energy_entries "
+    "WHERE name = ? AND date < ? ORDER BY date DESC LIMIT ?"
+)
+MONTHLY_SQL = f"SELECT month, count, {', '.join(MONTHLY_FIELDS)} FROM energy_monthly WHERE name = ? ORDER BY month"
+VERSION_SQL = "SELECT version FROM energy_versions WHERE name = ?"
+MONTHLY_EXISTS_SQL = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'energy_monthly'"
+RANGE_SQL = (
+    f"SELECT {', '.join(COLUMNS)} FROM energy_entries "
+    "WHERE name = ? AND date >= ? AND date <= ? ORDER BY date"
+)
+BOUNDS_SQL = "SELECT MIN(date), MAX(date) FROM energy_entries WHERE name = ?"
+
+# Sort after/before every ISO date, so the first page starts at the newest entry
+LATEST = "9999-12-31"
+EARLIEST = "0000-01-01"
+
+
+def sqlite_path():
+    return os.environ.get(SQLITE_PATH_SETTING) or None
+
+
+def _close(actual, expected):
+    # None (no entries this month) only matches None
+    if actual is None or expected is None:
+        return actual is None and expected is None
+    return math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def compare_aggregates(actual, expected):
+    # Differences between two aggregates dicts, as in EnergyEntryStore.verify_aggregates
+    mismatches = []
+    if actual['count'] != expected['count']:
+        mismatches.append(f"count is {actual['count']}, entries give {expected['count']}")
+    fields = ['total_energy', 'total_co2', 'projected_bill']
+    if expected['count']:
+        fields += ['avg_energy', 'avg_cost']
+    for field in fields:
+        if not _close(actual[field], expected[field]):
+            mismatches.append(f"{field} is {actual[field]}, entries give {expected[field]}")
+    actual_months = dict(actual['monthly_cost'].itertuples(index=False))
+    expected_months = dict(expected['monthly_cost'].itertuples(index=False))
+    for month in sorted(set(actual_months) | set(expected_months)):
+        if month not in actual_months or month not in expected_months:
+            mismatches.append(f"{month}: present in only one of the totals and the entries")
+        elif not _close(actual_months[month], expected_months[month]):
+            mismatches.append(f"{month}: cost is {actual_months[month]}, entries give {expected_months[month]}")
+    return mismatches
+
+
+class SQLiteEnergyBackend:
+    def __init__(self, path, busy_timeout=10.0, pool_size=POOL_SIZE):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        with self._connection() as connection, self._transaction(connection):
+            backfill = connection.execute(MONTHLY_EXISTS_SQL).fetchone() is None
+            for statement in [SCHEMA_SQL, MONTHLY_SCHEMA_SQL, VERSIONS_SCHEMA_SQL] + TRIGGERS_SQL:
+                connection.execute(statement)
+            if backfill:
+                for statement in BACKFILL_SQL:
+                    connection.execute(statement)
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                     cached_statements=64, check_same_thread=False)
+        # WAL lets readers run while one writer commits; writers queue on busy_timeout
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextlib.contextmanager
+    def _connection(self):
+        # Streamlit starts a new thread for every script run, so connections are
+        # pooled rather than kept per thread; that way they and their statement
+        # caches survive between reruns. A connection is only ever used by the
+        # thread that took it from the pool.
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            try:
+                self._pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _transaction(connection):
+        # IMMEDIATE takes the write lock up front, so nothing else commits in between
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def upsert(self, name, entry):
+        # Returns (replaced, version): whether an entry for that (name, date) was
+        # replaced, and the user's change counter just before this save (the
+        # triggers add one to it)
+        date = str(pd.Timestamp(entry['date']).date())
+        values = [entry.get(field, '' if field in TEXT_FIELDS else 0) for field in DATA_FIELDS]
+        with self._connection() as connection, self._transaction(connection):
+            version = self._version(connection, name)
+            existed = connection.execute(EXISTS_SQL, (name, date)).fetchone() is not None
+            connection.execute(UPSERT_SQL, [name, date] + [
+                value.item() if hasattr(value, 'item') else value for value in values
+            ])
+        return existed, version
+
+    @staticmethod
+    def _version(connection, name):
+        row = connection.execute(VERSION_SQL, (name,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def version(self, name):
+        # Changes with every save of that user's entries, from any connection
+        with self._connection() as connection:
+            return self._version(connection, name)
+
+    def page(self, name, before=LATEST, limit=PAGE_SIZE):
+        # Keyset page of entries older than `before`, newest first
+        with self._connection() as connection:
+            rows = connection.execute(PAGE_SQL, (name, before, limit)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def entries(self, name, start=None, end=None):
+        # Every entry with start <= date <= end (either bound optional), oldest
+        # first, in the columns and dtypes of EnergyEntryStore.frame()
+        start = EARLIEST if start is None else str(pd.Timestamp(start).date())
+        end = LATEST if end is None else str(pd.Timestamp(end).date())
+        with self._connection() as connection:
+            rows = connection.execute(RANGE_SQL, (name, start, end)).fetchall()
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+        return df.astype(NUMERIC_FIELDS)
+
+    def date_bounds(self, name):
+        # (first, last) entry date, or None without entries
+        with self._connection() as connection:
+            first, last = connection.execute(BOUNDS_SQL, (name,)).fetchone()
+        return (pd.Timestamp(first), pd.Timestamp(last)) if first is not None else None
+
+    def aggregates(self, name, current_month):
+        # From the running monthly totals: one row per month, however many entries
+        with self._connection() as connection:
+            rows = connection.execute(MONTHLY_SQL, (name,)).fetchall()
+        monthly = pd.DataFrame(rows, columns=['month', 'count'] + MONTHLY_FIELDS)
+        count = int(monthly['count'].sum())
+        totals = {field: math.fsum(monthly[field]) for field in MONTHLY_FIELDS}
+        current = monthly[monthly['month'] == str(current_month)]
+        return {
+            'count': count,
+            'avg_energy': totals['total_energy'] / count if count else 0.0,
+            'total_energy': totals['total_energy'],
+            'avg_cost': totals['cost'] / count if count else 0.0,
+            'total_co2': totals['carbon_footprint'],
+            'monthly_cost': monthly[['month', 'cost']],
+            'projected_bill': current['cost'].iloc[0] / current['count'].iloc[0] * 30 if len(current) else None,
+        }
+
+
+# Session view of one user's history: saves go to SQLite and then into a small
+# in-memory EnergyEntryStore holding the pages loaded so far
+class SQLiteEntryStore:
+    def __init__(self, backend, name, page_size=PAGE_SIZE):
+        self.backend = backend
+        self.name = name
+        self.page_size = page_size
+        self.cache = EnergyEntryStore()
+        self.version = 0
+        self.has_more = True
+        self._oldest = LATEST
+        self._history = None
+        self._history_key = None
+        # The database change counter the loaded pages are current with
+        self._db_version = backend.version(name)
+        self.load_more()
+
+    def __len__(self):
+        return self.history().count
+
+    def upsert(self, entry):
+        updated, version = self.backend.upsert(self.name, entry)
+        self.cache.upsert(entry)
+        if version == self._db_version:
+            # Only this save changed the entries since the pages were loaded
+            self._db_version = version + 1
+        self.version += 1
+        return updated
+
+    def _reload(self, db_version):
+        # Another session or process saved: re-read the pages loaded so far
+        self.cache = EnergyEntryStore()
+        self._db_version = db_version
+        if self._oldest == LATEST:
+            # Nothing was loaded yet, so start again from the newest page
+            self.load_more()
+            return
+        for row in self.backend.entries(self.name, self._oldest).to_dict('records'):
+            self.cache.upsert(row)
+        self.version += 1
+
+    def load_more(self):
+        rows = self.backend.page(self.name, self._oldest, self.page_size)
+        for row in rows:
+            self.cache.upsert(row)
+        if rows:
+            self._oldest = rows[-1]['date']
+        self.has_more = len(rows) == self.page_size
+        self.version += 1
+
+    def frame(self):
+        return self.cache.frame()
+
+    # Exports read the database, so entries in pages not loaded yet are included
+    def entries(self, start=None, end=None):
+        return self.backend.entries(self.name, start, end)
+
+    def date_bounds(self):
+        return self.backend.date_bounds(self.name)
+
+    def verify_aggregates(self):
+        # Compares the SQL totals with a recomputation from every stored entry
+        current_month = pd.Timestamp.today().to_period('M')
+        return compare_aggregates(self.backend.aggregates(self.name, current_month),
+                                  aggregate_history(self.entries(), current_month))
+
+    def history(self):
+        # Charts use the loaded pages; totals and monthly costs come from SQL.
+        # Saves from other sessions or processes show up in the change counter.
+        db_version = self.backend.version(self.name)
+        if db_version != self._db_version:
+            self._reload(db_version)
+        key = (self.version, pd.Timestamp.today().to_period('M'))
+        if self._history_key != key:
+            aggregates = self.backend.aggregates(self.name, key[1])
+            self._history = EnergyHistory(self.cache.frame(), key[1], aggregates)
+            self._history_key = key
+        return self._history
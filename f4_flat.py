@@ -3,36 +3,28 @@
 # City = input("Enter Your City : ")
 # Area = input("Enter Your Area : ")
 
+from energy_model import CHECKLIST_MODEL
+
 data = []
 BHK = ["1BHK","2BHK","3BHK"]
-cal_enrgy =0
 print("1. Flat")
 print("2. Tenament ( House )")
 s1 = int(input("Enter Number : ")) 
 
+# Only flats add the lights and fans baseline
+home = "Tenement"
 if s1 == 1 :
     bhk = int(input("1BHK,2BHK,3BHK"))
-    if bhk == 1 :
-        cal_enrgy += 2*0.4 + 2*0.8
-        
-    elif bhk == 2 :
-        cal_enrgy += 2 * .4 + 2 * .8
-
-    elif bhk == 3 :
-        cal_enrgy += 2 * .4 + 2 * .8
+    if 1 <= bhk <= 3 :
+        home = BHK[bhk - 1]
 
 
 ac = input("You Have a Ac? Yes or No\n").lower()
-if ac == "yes":
-    cal_enrgy+=3
-
 fridge = input("You Have a Fridge? Yes or No\n").lower()
-if fridge == "yes":
-    cal_enrgy+=3
-
 wm = input("You Have a Washing Machine? Yes or No\n").lower()
-if wm == "yes":
-    cal_enrgy+=3
+
+cal_enrgy = CHECKLIST_MODEL.evaluate(home, ac=int(ac == "yes"), fridge=int(fridge == "yes"),
+                                     washing_machine=int(wm == "yes"))['total_energy']
 
 print("Total Energy : ",cal_enrgy)
 
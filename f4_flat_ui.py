@@ -1,10 +1,15 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, date
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from energy_charts import trend_figure
+from energy_entries import EnergyEntryStore
+from energy_model import HOURLY_MODEL
+from energy_shared import SharedEnergyStore, SharedUserStore
+from energy_sqlite import SQLiteEnergyBackend, SQLiteEntryStore, sqlite_path
+
 # Page configuration
 st.set_page_config(
     page_title="Energy Consumption Tracker",
@@ -51,9 +56,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Shared history database, enabled by setting ENERGY_TRACKER_SQLITE
+@st.cache_resource
+def init_sqlite_backend():
+    path = sqlite_path()
+    return SQLiteEnergyBackend(path) if path else None
+
+# In-process store shared by every session on this server
+@st.cache_resource
+def init_shared_store():
+    return SharedEnergyStore()
+
 # Initialize session state for data persistence
 if 'energy_data' not in st.session_state:
-    st.session_state.energy_data = []
+    st.session_state.energy_data = EnergyEntryStore()
 
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = {}
@@ -95,6 +111,15 @@ with st.sidebar:
         'facility': facility
     })
 
+# Once a name is entered the history lives in the SQLite backend, if configured,
+# or else in the store shared by every session, so area averages span households
+sqlite_backend = init_sqlite_backend()
+if name and getattr(st.session_state.energy_data, 'name', None) != name:
+    if sqlite_backend is not None:
+        st.session_state.energy_data = SQLiteEntryStore(sqlite_backend, name)
+    else:
+        st.session_state.energy_data = SharedUserStore(init_shared_store(), name)
+
 # Main content area
 col1, col2 = st.columns([2, 1])
 
@@ -144,39 +169,15 @@ with col1:
 with col2:
     st.markdown("### ⚡ Energy Calculation")
     
-    # Calculate base energy consumption based on home size
-    base_energy = 0
-    if facility == "1BHK":
-        base_energy = 2 * 0.4 + 2 * 0.8  # 2 lights + 2 fans base
-    elif facility == "2BHK":
-        base_energy = 3 * 0.4 + 3 * 0.8  # 3 lights + 3 fans base
-    elif facility == "3BHK":
-        base_energy = 4 * 0.4 + 4 * 0.8  # 4 lights + 4 fans base
-    
-    # Calculate appliance energy consumption (kWh)
-    appliance_energy = 0
-    
-    # AC consumption (assuming 1.5kW per hour)
-    if ac_usage == "Yes":
-        appliance_energy += ac_hours * 1.5
-    
-    # Fridge consumption (assuming 0.15kW per hour, adjusted by efficiency)
-    if fridge_usage == "Yes":
-        fridge_factor = {1: 0.2, 2: 0.18, 3: 0.15, 4: 0.12, 5: 0.1}
-        appliance_energy += 24 * fridge_factor.get(fridge_efficiency, 0.15)
-    
-    # Washing machine (assuming 2kW per cycle)
-    appliance_energy += wm_cycles * 2
-    
-    # Additional appliances
-    appliance_energy += lights_hours * 0.06  # LED lights
-    appliance_energy += fans_hours * 0.075   # Ceiling fans
-    appliance_energy += tv_hours * 0.15      # LED TV
-    
-    total_energy = base_energy + appliance_energy
-    
-    # Energy cost calculation (assuming ₹5 per kWh)
-    energy_cost = total_energy * 5
+    # Base load by home size plus each appliance's usage (see energy_model.HOURLY_MODEL)
+    energy = HOURLY_MODEL.evaluate(
+        facility, ac_hours=ac_hours, fridge_efficiency=fridge_efficiency, wm_cycles=wm_cycles,
+        lights_hours=lights_hours, fans_hours=fans_hours, tv_hours=tv_hours
+    )
+    base_energy = energy['base_energy']
+    appliance_energy = energy['appliance_energy']
+    total_energy = energy['total_energy']
+    energy_cost = energy['cost']
     
     # Display energy metrics
     st.markdown(f"""
@@ -191,8 +192,7 @@ with col2:
     st.metric("Base Consumption", f"{base_energy:.2f} kWh")
     st.metric("Appliances", f"{appliance_energy:.2f} kWh")
     
-    # Carbon footprint (assuming 0.82 kg CO2 per kWh)
-    carbon_footprint = total_energy * 0.82
+    carbon_footprint = energy['carbon_footprint']
     st.metric("Carbon Footprint", f"{carbon_footprint:.2f} kg CO₂")
 
 # Save data button
@@ -217,15 +217,10 @@ if st.button("💾 Save Daily Consumption", type="primary"):
             'tv_hours': tv_hours
         }
         
-        # Check if entry for this date already exists
-        existing_entry = next((i for i, item in enumerate(st.session_state.energy_data) 
-                             if item['date'] == selected_date), None)
-        
-        if existing_entry is not None:
-            st.session_state.energy_data[existing_entry] = entry
+        # Replaces the entry for this date if one already exists
+        if st.session_state.energy_data.upsert(entry):
             st.success(f"Updated energy data for {selected_date}")
         else:
-            st.session_state.energy_data.append(entry)
             st.success(f"Saved energy data for {selected_date}")
     else:
         st.error("Please enter your name in the sidebar first!")
@@ -234,44 +229,54 @@ if st.button("💾 Save Daily Consumption", type="primary"):
 if st.session_state.energy_data:
     st.markdown("### 📊 Historical Energy Consumption")
     
-    # Convert to DataFrame for easier manipulation
-    df = pd.DataFrame(st.session_state.energy_data)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
+    # Sorted frame and aggregates, recomputed only after a save
+    history = st.session_state.energy_data.history()
+    df = history.df
     
     # Display recent entries
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### 📅 Recent Entries")
-        recent_df = df.tail(5)[['date', 'total_energy', 'cost']].copy()
-        recent_df['date'] = recent_df['date'].dt.strftime('%Y-%m-%d')
-        st.dataframe(recent_df, use_container_width=True)
+        st.dataframe(history.recent, use_container_width=True)
     
     with col2:
         st.markdown("#### 📈 Energy Trends")
         if len(df) > 1:
-            fig = px.line(df, x='date', y='total_energy', 
-                         title='Daily Energy Consumption Trend',
-                         labels={'total_energy': 'Energy (kWh)', 'date': 'Date'})
-            fig.update_layout(height=300)
+            # Long histories are downsampled and drawn with WebGL
+            dates, energy = history.trend('total_energy')
+            fig = trend_figure(dates, energy, 'Daily Energy Consumption Trend',
+                               x_label='Date', y_label='Energy (kWh)', total_points=len(df))
             st.plotly_chart(fig, use_container_width=True)
+
+    # Older pages of a SQLite-backed history are fetched on request
+    if getattr(st.session_state.energy_data, 'has_more', False):
+        st.button("Load older entries", on_click=st.session_state.energy_data.load_more)
     
     # Summary statistics
     st.markdown("#### 📊 Summary Statistics")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Average Daily", f"{df['total_energy'].mean():.2f} kWh")
+        st.metric("Average Daily", f"{history.avg_energy:.2f} kWh")
     
     with col2:
-        st.metric("Total This Month", f"{df['total_energy'].sum():.2f} kWh")
+        st.metric("Total This Month", f"{history.total_energy:.2f} kWh")
     
     with col3:
-        st.metric("Average Cost", f"₹{df['cost'].mean():.2f}")
+        st.metric("Average Cost", f"₹{history.avg_cost:.2f}")
     
     with col4:
-        st.metric("Total CO₂", f"{df['carbon_footprint'].sum():.2f} kg")
+        st.metric("Total CO₂", f"{history.total_co2:.2f} kg")
+
+    # Comparison with every household in the same area
+    if isinstance(st.session_state.energy_data, SharedUserStore) and area:
+        area_summary = st.session_state.energy_data.shared.area_summary(area)
+        if area_summary is not None:
+            st.metric(f"🏘️ {area} Average Daily", f"{area_summary['avg_energy']:.2f} kWh",
+                      delta=f"{history.avg_energy - area_summary['avg_energy']:+.2f} kWh (you)",
+                      delta_color="inverse",
+                      help=f"{area_summary['households']} households, {area_summary['entries']} entries")
     
     # Detailed analytics
     if len(df) >= 7:
@@ -294,11 +299,7 @@ if st.session_state.energy_data:
         
         with col2:
             # Monthly cost trend
-            df['month'] = df['date'].dt.to_period('M')
-            monthly_cost = df.groupby('month')['cost'].sum().reset_index()
-            monthly_cost['month'] = monthly_cost['month'].astype(str)
-            
-            fig = px.bar(monthly_cost, x='month', y='cost',
+            fig = px.bar(history.monthly_cost, x='month', y='cost',
                         title='Monthly Energy Cost',
                         labels={'cost': 'Cost (₹)', 'month': 'Month'})
             st.plotly_chart(fig, use_container_width=True)
@@ -1,10 +1,16 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, date
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from energy_charts import trend_figure
+from energy_entries import EnergyEntryStore
+from energy_export import EXPORT_FORMATS, available_formats, export_entries, export_file_name
+from energy_model import HOURLY_MODEL
+from energy_savings import SETTINGS, SavingsGrid
+from energy_sqlite import SQLiteEnergyBackend, SQLiteEntryStore, sqlite_path
+
 # Page configuration
 st.set_page_config(
     page_title="Energy Consumption Tracker",
@@ -40,9 +46,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Shared history database, enabled by setting ENERGY_TRACKER_SQLITE
+@st.cache_resource
+def init_sqlite_backend():
+    path = sqlite_path()
+    return SQLiteEnergyBackend(path) if path else None
+
 # Initialize session state
 if 'energy_data' not in st.session_state:
-    st.session_state.energy_data = []
+    st.session_state.energy_data = EnergyEntryStore()
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = {}
 
@@ -75,135 +87,186 @@ with st.sidebar:
         'flat_tenement': flat_tenement, 'facility': facility
     })
 
-# Main Content
-col1, col2 = st.columns([2, 1])
+# With the SQLite backend each user's history is loaded from the database
+sqlite_backend = init_sqlite_backend()
+if sqlite_backend is not None and name and getattr(st.session_state.energy_data, 'name', None) != name:
+    st.session_state.energy_data = SQLiteEntryStore(sqlite_backend, name)
 
-with col1:
-    st.markdown("### \ud83d\udcca Daily Energy Consumption Entry")
-    selected_date = st.date_input("Select Date", value=date.today())
-    st.markdown("#### \ud83c\udfe0 Appliance Usage")
-    col_ac, col_fridge, col_wm = st.columns(3)
+# Running monthly totals checked against a full recomputation from the entries
+if st.sidebar.checkbox("🩺 Check monthly totals"):
+    mismatches = st.session_state.energy_data.verify_aggregates()
+    if mismatches:
+        st.sidebar.error("Monthly totals differ from the entries:\n\n" + "\n\n".join(mismatches))
+    else:
+        st.sidebar.success("Monthly totals match the entries")
 
-    with col_ac:
-        ac_usage = st.selectbox("Air Conditioner", ["No", "Yes"], key="ac")
-        ac_hours = st.slider("Hours of AC usage", 0, 24, 8, key="ac_hours") if ac_usage == "Yes" else 0
+# Energy of every appliance-setting combination; built once per process
+@st.cache_resource
+def savings_grid(has_fridge):
+    return SavingsGrid(has_fridge)
 
-    with col_fridge:
-        fridge_usage = st.selectbox("Refrigerator", ["No", "Yes"], key="fridge")
-        fridge_efficiency = st.slider("Fridge Efficiency (1-5)", 1, 5, 3, key="fridge_eff") if fridge_usage == "Yes" else 0
+# Entry form and live calculation. As a fragment, moving a slider reruns only
+# this panel instead of rebuilding the history charts below.
+@st.fragment
+def entry_panel(name, city, area, facility):
+    col1, col2 = st.columns([2, 1])
 
-    with col_wm:
-        wm_usage = st.selectbox("Washing Machine", ["No", "Yes"], key="wm")
-        wm_cycles = st.slider("Number of wash cycles", 0, 5, 1, key="wm_cycles") if wm_usage == "Yes" else 0
+    with col1:
+        st.markdown("### \ud83d\udcca Daily Energy Consumption Entry")
+        selected_date = st.date_input("Select Date", value=date.today())
+        st.markdown("#### \ud83c\udfe0 Appliance Usage")
+        col_ac, col_fridge, col_wm = st.columns(3)
 
-    st.markdown("#### \ud83d\udca1 Additional Appliances")
-    col_lights, col_fans, col_tv = st.columns(3)
-    lights_hours = st.slider("Lights usage (hours)", 0, 24, 6, key="lights")
-    fans_hours = st.slider("Fans usage (hours)", 0, 24, 8, key="fans")
-    tv_hours = st.slider("TV usage (hours)", 0, 24, 4, key="tv")
+        with col_ac:
+            ac_usage = st.selectbox("Air Conditioner", ["No", "Yes"], key="ac")
+            ac_hours = st.slider("Hours of AC usage", 0, 24, 8, key="ac_hours") if ac_usage == "Yes" else 0
 
-with col2:
-    st.markdown("### \u26a1 Energy Calculation")
-    base_energy = {"1BHK": 2*0.4+2*0.8, "2BHK": 3*0.4+3*0.8, "3BHK": 4*0.4+4*0.8}[facility]
-    fridge_factor = {1: 0.2, 2: 0.18, 3: 0.15, 4: 0.12, 5: 0.1}
-
-    appliance_breakdown = {
-        "AC": ac_hours * 1.5,
-        "Fridge": 24 * fridge_factor.get(fridge_efficiency, 0.15) if fridge_usage == "Yes" else 0,
-        "Washing Machine": wm_cycles * 2,
-        "Lights": lights_hours * 0.06,
-        "Fans": fans_hours * 0.075,
-        "TV": tv_hours * 0.15
-    }
+        with col_fridge:
+            fridge_usage = st.selectbox("Refrigerator", ["No", "Yes"], key="fridge")
+            fridge_efficiency = st.slider("Fridge Efficiency (1-5)", 1, 5, 3, key="fridge_eff") if fridge_usage == "Yes" else 0
 
-    appliance_energy = sum(appliance_breakdown.values())
-    total_energy = base_energy + appliance_energy
-    energy_cost = total_energy * 5
-    carbon_footprint = total_energy * 0.82
-
-    st.markdown(f"""
-    <div class='energy-card'>
-        <h3>Daily Energy Consumption</h3>
-        <h2>{total_energy:.2f} kWh</h2>
-        <p>Estimated Cost: ₹{energy_cost:.2f}</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    if total_energy > 20:
-        st.warning("\u26a0\ufe0f High energy consumption detected! Consider reducing usage.")
-
-    max_appliance = max(appliance_breakdown, key=appliance_breakdown.get)
-    st.info(f"\ud83d\udd0d Most consuming appliance today: **{max_appliance}**")
-
-    if total_energy < 10:
-        score = "\U0001F7E2 Efficient"
-    elif total_energy < 15:
-        score = "\U0001F7E1 Moderate"
-    else:
-        score = "\U0001F534 High Consumption"
-    st.metric("Efficiency Score", score)
-
-    st.metric("Base Consumption", f"{base_energy:.2f} kWh")
-    st.metric("Appliances", f"{appliance_energy:.2f} kWh")
-    st.metric("Carbon Footprint", f"{carbon_footprint:.2f} kg CO₂")
-
-if st.button("\ud83d\udcc2 Save Daily Consumption", type="primary"):
-    if name:
-        entry = {
-            'date': selected_date, 'name': name, 'city': city, 'area': area,
-            'facility': facility, 'total_energy': total_energy,
-            'base_energy': base_energy, 'appliance_energy': appliance_energy,
-            'cost': energy_cost, 'carbon_footprint': carbon_footprint,
-            'ac_hours': ac_hours, 'fridge_efficiency': fridge_efficiency,
-            'wm_cycles': wm_cycles, 'lights_hours': lights_hours,
-            'fans_hours': fans_hours, 'tv_hours': tv_hours
-        }
-        existing_entry = next((i for i, item in enumerate(st.session_state.energy_data) if item['date'] == selected_date), None)
-        if existing_entry is not None:
-            st.session_state.energy_data[existing_entry] = entry
-            st.success(f"Updated energy data for {selected_date}")
+        with col_wm:
+            wm_usage = st.selectbox("Washing Machine", ["No", "Yes"], key="wm")
+            wm_cycles = st.slider("Number of wash cycles", 0, 5, 1, key="wm_cycles") if wm_usage == "Yes" else 0
+
+        st.markdown("#### \ud83d\udca1 Additional Appliances")
+        col_lights, col_fans, col_tv = st.columns(3)
+        lights_hours = st.slider("Lights usage (hours)", 0, 24, 6, key="lights")
+        fans_hours = st.slider("Fans usage (hours)", 0, 24, 8, key="fans")
+        tv_hours = st.slider("TV usage (hours)", 0, 24, 4, key="tv")
+
+    with col2:
+        st.markdown("### \u26a1 Energy Calculation")
+        energy = HOURLY_MODEL.evaluate(
+            facility, ac_hours=ac_hours, fridge_efficiency=fridge_efficiency, wm_cycles=wm_cycles,
+            lights_hours=lights_hours, fans_hours=fans_hours, tv_hours=tv_hours
+        )
+        appliance_breakdown = energy['breakdown']
+        base_energy = energy['base_energy']
+        appliance_energy = energy['appliance_energy']
+        total_energy = energy['total_energy']
+        energy_cost = energy['cost']
+        carbon_footprint = energy['carbon_footprint']
+
+        st.markdown(f"""
+        <div class='energy-card'>
+            <h3>Daily Energy Consumption</h3>
+            <h2>{total_energy:.2f} kWh</h2>
+            <p>Estimated Cost: ₹{energy_cost:.2f}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        if total_energy > 20:
+            st.warning("\u26a0\ufe0f High energy consumption detected! Consider reducing usage.")
+
+        max_appliance = max(appliance_breakdown, key=appliance_breakdown.get)
+        st.info(f"\ud83d\udd0d Most consuming appliance today: **{max_appliance}**")
+
+        if total_energy < 10:
+            score = "\U0001F7E2 Efficient"
+        elif total_energy < 15:
+            score = "\U0001F7E1 Moderate"
         else:
-            st.session_state.energy_data.append(entry)
-            st.success(f"Saved energy data for {selected_date}")
-    else:
-        st.error("Please enter your name in the sidebar first!")
+            score = "\U0001F534 High Consumption"
+        st.metric("Efficiency Score", score)
+
+        st.metric("Base Consumption", f"{base_energy:.2f} kWh")
+        st.metric("Appliances", f"{appliance_energy:.2f} kWh")
+        st.metric("Carbon Footprint", f"{carbon_footprint:.2f} kg CO₂")
+
+    if st.button("\ud83d\udcc2 Save Daily Consumption", type="primary"):
+        if name:
+            entry = {
+                'date': selected_date, 'name': name, 'city': city, 'area': area,
+                'facility': facility, 'total_energy': total_energy,
+                'base_energy': base_energy, 'appliance_energy': appliance_energy,
+                'cost': energy_cost, 'carbon_footprint': carbon_footprint,
+                'ac_hours': ac_hours, 'fridge_efficiency': fridge_efficiency,
+                'wm_cycles': wm_cycles, 'lights_hours': lights_hours,
+                'fans_hours': fans_hours, 'tv_hours': tv_hours
+            }
+            if st.session_state.energy_data.upsert(entry):
+                st.session_state.save_message = f"Updated energy data for {selected_date}"
+            else:
+                st.session_state.save_message = f"Saved energy data for {selected_date}"
+            # A full rerun, so the history section picks up the new entry
+            st.rerun()
+        else:
+            st.error("Please enter your name in the sidebar first!")
+
+    if 'save_message' in st.session_state:
+        st.success(st.session_state.pop('save_message'))
+
+    st.markdown("#### 🔎 Find My Savings")
+    if st.toggle("Search every combination of appliance settings", key="find_savings"):
+        current = {
+            'ac_hours': ac_hours, 'fridge_efficiency': fridge_efficiency, 'wm_cycles': wm_cycles,
+            'lights_hours': lights_hours, 'fans_hours': fans_hours, 'tv_hours': tv_hours
+        }
+        grid = savings_grid(fridge_usage == "Yes")
+        max_comfort_cost = st.slider(
+            "Comfort you are willing to give up (points)", 0.0, 30.0, 5.0, 0.5, key="comfort_budget",
+            help="Per hour less: AC 1, lights 0.8, fans 0.6, TV 0.4. Per wash cycle less: 1.5. "
+                 "Per fridge efficiency level upgraded: 2.")
+        best = grid.best(current, max_comfort_cost)
+        front = grid.pareto_front(current)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"Top savings within {max_comfort_cost:g} comfort points "
+                        f"({grid.size:,} combinations checked)")
+            if best.empty:
+                st.info("No combination within this comfort budget uses less energy than your current settings.")
+            else:
+                st.dataframe(best, use_container_width=True, hide_index=True)
+        with col2:
+            fig = px.line(front, x='comfort_cost', y='saved_kwh', markers=True,
+                          hover_data=[column for column in front.columns if column in SETTINGS],
+                          title='Most energy saved for each comfort cost',
+                          labels={'comfort_cost': 'Comfort cost (points)', 'saved_kwh': 'Saved (kWh/day)'})
+            fig.update_layout(height=300)
+            st.plotly_chart(fig, use_container_width=True)
+
+
+entry_panel(name, city, area, facility)
+
+# History and analytics; rebuilt on a full rerun or by its own buttons
+@st.fragment
+def history_panel():
+    if not st.session_state.energy_data:
+        return
 
-if st.session_state.energy_data:
     st.markdown("### \ud83d\udcca Historical Energy Consumption")
-    df = pd.DataFrame(st.session_state.energy_data)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
+    history = st.session_state.energy_data.history()
+    df = history.df
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("#### \ud83d\uddd3\ufe0f Recent Entries")
-        recent_df = df.tail(5)[['date', 'total_energy', 'cost']].copy()
-        recent_df['date'] = recent_df['date'].dt.strftime('%Y-%m-%d')
-        st.dataframe(recent_df, use_container_width=True)
+        st.dataframe(history.recent, use_container_width=True)
     with col2:
         if len(df) > 1:
-            fig = px.line(df, x='date', y='total_energy', title='Daily Energy Consumption Trend')
-            fig.update_layout(height=300)
+            dates, energy = history.trend('total_energy')
+            fig = trend_figure(dates, energy, 'Daily Energy Consumption Trend', total_points=len(df))
             st.plotly_chart(fig, use_container_width=True)
 
+    # Older pages of a SQLite-backed history are fetched on request
+    if getattr(st.session_state.energy_data, 'has_more', False):
+        st.button("Load older entries", on_click=st.session_state.energy_data.load_more)
+
     st.markdown("#### \ud83d\udcca Summary Statistics")
-    
+
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Average Daily", f"{df['total_energy'].mean():.2f} kWh")
+        st.metric("Average Daily", f"{history.avg_energy:.2f} kWh")
     with col2:
-        st.metric("Total This Month", f"{df['total_energy'].sum():.2f} kWh")
+        st.metric("Total This Month", f"{history.total_energy:.2f} kWh")
     with col3:
-        st.metric("Average Cost", f"₹{df['cost'].mean():.2f}")
+        st.metric("Average Cost", f"₹{history.avg_cost:.2f}")
     with col4:
-        st.metric("Total CO₂", f"{df['carbon_footprint'].sum():.2f} kg")
+        st.metric("Total CO₂", f"{history.total_co2:.2f} kg")
 
-    current_month = pd.Timestamp.today().to_period('M')
-    month_df = df[df['date'].dt.to_period('M') == current_month]
-    if not month_df.empty:
-        avg_daily_cost = month_df['cost'].mean()
-        projected_bill = avg_daily_cost * 30
-        
-        st.metric("\ud83d\udcc5 Projected Monthly Bill", f"₹{projected_bill:.2f}")
+    if history.projected_bill is not None:
+        st.metric("\ud83d\udcc5 Projected Monthly Bill", f"₹{history.projected_bill:.2f}")
 
     if len(df) >= 7:
         st.markdown("#### \ud83d\udd0d Weekly Analysis")
@@ -214,15 +277,44 @@ if st.session_state.energy_data:
                          names=['Base Consumption', 'Appliances'], title='Energy Consumption Breakdown')
             st.plotly_chart(fig, use_container_width=True)
         with col2:
-            df['month'] = df['date'].dt.to_period('M')
-            monthly_cost = df.groupby('month')['cost'].sum().reset_index()
-            monthly_cost['month'] = monthly_cost['month'].astype(str)
-            fig = px.bar(monthly_cost, x='month', y='cost', title='Monthly Energy Cost')
+            fig = px.bar(history.monthly_cost, x='month', y='cost', title='Monthly Energy Cost')
             st.plotly_chart(fig, use_container_width=True)
 
-    if st.button("\u2b07\ufe0f Download Data as CSV"):
-        csv = df.to_csv(index=False)
-        st.download_button("Download CSV", data=csv, file_name="energy_data.csv", mime="text/csv")
+    # The file is only serialized when the download button is clicked. A
+    # SQLite-backed history only holds the pages loaded so far, so its exports
+    # are read from the database instead.
+    store = st.session_state.energy_data
+    if isinstance(store, SQLiteEntryStore):
+        first_date, last_date = (day.date() for day in store.date_bounds())
+        export_source = store.entries
+    else:
+        first_date, last_date = df['date'].min().date(), df['date'].max().date()
+        export_source = lambda start, end: df
+    with st.expander("\u2b07\ufe0f Export Data"):
+        col1, col2 = st.columns(2)
+        with col1:
+            export_format = st.selectbox("Format", available_formats(), key="export_format",
+                                         format_func=lambda fmt: EXPORT_FORMATS[fmt][0])
+            export_columns = st.multiselect("Columns", list(df.columns), default=list(df.columns),
+                                            key="export_columns")
+        with col2:
+            export_range = st.date_input("Date range", value=(first_date, last_date),
+                                         min_value=first_date, max_value=last_date, key="export_range")
+        # The range picker holds a single date while the second one is being chosen
+        if len(export_range) == 2:
+            start, end = export_range
+        else:
+            start = end = export_range[0] if export_range else None
+        label, _, mime, _ = EXPORT_FORMATS[export_format]
+        st.download_button(
+            f"Download {label}",
+            data=lambda: export_entries(export_source(start, end), export_format, export_columns, start, end),
+            file_name=export_file_name(export_format), mime=mime,
+            disabled=not export_columns
+        )
+
+
+history_panel()
 
 # Tips Section
 st.markdown("### \ud83d\udca1 Energy Saving Tips")
@@ -1,12 +1,48 @@
 import streamlit as st
-import pymongo
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta
+import math
 import numpy as np
 from io import BytesIO
 import base64
+from matplotlib.figure import Figure
+from pymongo.errors import ConnectionFailure
+
+from energy_db import (
+    CHART_PROJECTION,
+    EXPORT_HEADER,
+    EXPORT_PROJECTION,
+    HISTORY_PROJECTION,
+    REJECTED_PATH,
+    SPOOL_PATH,
+    CircuitBreaker,
+    CollectionSetup,
+    RecordSpool,
+    RejectedRecords,
+    WriteBehindBuffer,
+    apply_rollups,
+    connect,
+    env_setting,
+    explain_aggregate,
+    explain_find,
+    export_stats_pipeline,
+    fetch_export_stats,
+    fetch_history_page,
+    fetch_recent_points,
+    fetch_summary,
+    history_key,
+    history_page_query,
+    iter_export_rows,
+    parse_write_concern,
+    rollup_collection,
+    summary_pipeline,
+    unique_users_pipeline,
+    uses_collscan,
+    write_export_csv,
+)
+from energy_model import APPLIANCES, ENERGY_RATES, calculate_costs, calculate_energy, calculate_energy_bulk
 
 # Configure page
 st.set_page_config(
@@ -102,35 +138,67 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize MongoDB connection
+# MongoDB client, circuit breaker and offline spool, shared by every session.
+# Nothing here touches the network, so a server that is down is never cached.
 @st.cache_resource
+def init_database():
+    collection = connect()
+    breaker = CircuitBreaker(
+        failure_threshold=env_setting("BREAKER_FAILURES", 1, int),
+        reset_timeout=env_setting("BREAKER_RESET", 15.0, float),
+    )
+    spool = RecordSpool(env_setting("SPOOL_PATH", SPOOL_PATH))
+    return collection, breaker, spool, CollectionSetup(collection)
+
+# Initialize MongoDB connection; None while the database is unavailable
 def init_connection():
+    collection, breaker, _, setup = init_database()
+    if not breaker.allow():
+        return None
     try:
-        client = pymongo.MongoClient("mongodb://localhost:27017/")
-        db = client["Workshop"]
-        collection = db["profile"]
+        collection.database.command("ping")
+        breaker.record_success()
+        # Indexes and the first rollup build, until they have succeeded once
+        setup.ensure()
         return collection
-    except Exception as e:
+    except ConnectionFailure as e:
+        breaker.record_failure()
         st.error(f"MongoDB connection failed: {e}")
         return None
+    except Exception as e:
+        # The server is reachable; this is not a reason to spool saves
+        st.error(f"MongoDB error: {e}")
+        return None
 
-# Energy calculation function
-def calculate_energy(appliances):
-    energy_rates = {
-        'light': 0.2,
-        'fans': 0.2,
-        'tv': 0.3,
-        'ac': 3.0,
-        'fridge': 3.1,
-        'washing_machine': 2.8
-    }
-    
-    total_energy = 0
-    for appliance, count in appliances.items():
-        if count > 0:
-            total_energy += count * energy_rates[appliance]
-    
-    return round(total_energy, 2)
+# Process-wide write-behind buffer shared by every session
+@st.cache_resource
+def init_write_buffer():
+    collection, breaker, spool, _ = init_database()
+    return WriteBehindBuffer(
+        collection,
+        max_batch=env_setting("WRITE_BATCH", 500, int),
+        max_delay=env_setting("WRITE_DELAY", 1.0, float),
+        write_concern=parse_write_concern(env_setting("WRITE_CONCERN", None)),
+        after_insert=lambda records: apply_rollups(collection, records),
+        breaker=breaker,
+        spool=spool,
+        rejected=RejectedRecords(env_setting("REJECTED_PATH", REJECTED_PATH)),
+    )
+
+# Query diagnostics: explain each query and warn when it scans the whole collection.
+# Some queries read every document on purpose (the full export, the small
+# rollup collection); their scans are noted rather than warned about.
+def check_query_plan(label, explain, full_scan=False):
+    if not st.session_state.get('query_diagnostics'):
+        return
+    try:
+        if uses_collscan(explain()):
+            if full_scan:
+                st.caption(f"🩺 {label}: full collection scan, as intended")
+            else:
+                st.warning(f"🩺 {label}: query falls back to COLLSCAN")
+    except Exception as e:
+        st.warning(f"🩺 {label}: explain failed ({e})")
 
 # Energy saving tips
 
@@ -161,24 +229,25 @@ def get_energy_tips(energy_consumption):
     return tips
 
 # Data visualization function
-def create_energy_chart(data):
-    if len(data) < 2:
+def create_energy_chart(points):
+    # points: (date, energy) pairs in chronological order
+    if len(points) < 2:
         return None
     
     # Prepare data for plotting
-    dates = [item['date'] for item in data[-7:]]  # Last 7 entries
-    energy_values = [item['energy_kwh_per_day'] for item in data[-7:]]
+    dates = [date for date, _ in points]
+    energy_values = [energy for _, energy in points]
     day_names = [datetime.strptime(date, '%Y-%m-%d').strftime('%a\n%m-%d') for date in dates]
     
-    # Create matplotlib figure
-    fig, ax = plt.subplots(figsize=(12, 6))
+    # Figure is used directly (not pyplot) so it can render on the download thread
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
     
     # Plot line chart
-    colors = ['red' if energy > 15 else 'green' for energy in energy_values]
     ax.plot(day_names, energy_values, marker='o', linewidth=2, markersize=8, color='#667eea')
     
     # Color markers based on energy consumption
-    for i, (day, energy) in enumerate(zip(day_names, energy_values)):
+    for day, energy in zip(day_names, energy_values):
         color = '#ff4444' if energy > 15 else '#44ff44'
         ax.scatter(day, energy, color=color, s=100, zorder=5)
         ax.annotate(f'{energy:.1f}', (day, energy), textcoords="offset points", 
@@ -191,11 +260,24 @@ def create_energy_chart(data):
     ax.set_facecolor('#f8f9fa')
     
     # Style the plot
-    plt.xticks(rotation=0)
-    plt.tight_layout()
+    ax.tick_params(axis='x', labelrotation=0)
+    fig.tight_layout()
     
     return fig
 
+# Rendered PNG bytes, cached by the plotted points and resolution
+PREVIEW_DPI = 80
+DOWNLOAD_DPI = 300
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_energy_chart(points, dpi):
+    fig = create_energy_chart(points)
+    if fig is None:
+        return None
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
 # Main app function
 def main():
     # Header
@@ -208,6 +290,7 @@ def main():
     
     # Initialize database connection
     collection = init_connection()
+    write_buffer = init_write_buffer()
     
     # Sidebar for theme toggle and navigation
     with st.sidebar:
@@ -221,16 +304,38 @@ def main():
         theme = st.selectbox("🎨 Theme", ["Light Mode", "Dark Mode"], help="Theme selection")
         
         # Navigation
-        page = st.selectbox("📋 Navigate", ["Energy Calculator", "View History", "Export Data"])
+        page = st.selectbox("📋 Navigate", ["Energy Calculator", "Bulk Scoring", "View History", "Export Data"])
+        
+        # Diagnostic mode
+        st.checkbox("🩺 Query diagnostics", key="query_diagnostics",
+                    help="Explain every database query and warn on collection scans")
+        
+        metrics = write_buffer.metrics()
+        if metrics['records_rejected']:
+            st.error(f"❌ {metrics['records_rejected']} records could not be saved and were set aside in "
+                     f"{write_buffer.rejected.path} (last error: {metrics['last_rejection']})")
+        if metrics['spool_lines_corrupt']:
+            st.warning(f"⚠️ {metrics['spool_lines_corrupt']} unreadable lines in the offline spool "
+                       f"were moved to {write_buffer.spool.corrupt_path}")
+        
+        if st.session_state.get('query_diagnostics'):
+            st.caption(f"📮 Write queue: {metrics['queue_depth']} pending, "
+                       f"{metrics['records_written']} written in {metrics['flushes']} flushes, "
+                       f"last flush {metrics['last_flush_ms']:.1f} ms "
+                       f"(avg {metrics['avg_flush_ms']:.1f} ms, max {metrics['max_flush_ms']:.1f} ms)")
+            st.caption(f"🔌 Circuit {metrics['circuit']}, {metrics['spool_depth']} records spooled offline, "
+                       f"{metrics['records_replayed']} replayed")
     
     if page == "Energy Calculator":
-        show_energy_calculator(collection)
+        show_energy_calculator(write_buffer)
+    elif page == "Bulk Scoring":
+        show_bulk_scoring()
     elif page == "View History":
         show_history(collection)
     elif page == "Export Data":
         show_export_data(collection)
 
-def show_energy_calculator(collection):
+def show_energy_calculator(write_buffer):
     st.header("📊 Energy Consumption Calculator")
     
     # User Profile Section
@@ -294,10 +399,7 @@ def show_energy_calculator(collection):
         
         # Calculate energy consumption
         total_energy = calculate_energy(appliances)
-        rate_per_unit = 8  # ₹ per kWh
-        daily_cost = round(total_energy * rate_per_unit, 2)
-        monthly_cost = round(daily_cost * 30, 2)
-        yearly_cost = round(daily_cost * 365, 2)
+        daily_cost, monthly_cost, yearly_cost = calculate_costs(total_energy)
         
         # Display results
         st.success("✅ Calculation Complete!")
@@ -319,12 +421,9 @@ def show_energy_calculator(collection):
         
         # Energy breakdown chart
         if total_energy > 0:
+            # Same rates as the total above, in APPLIANCES order
             appliance_names = ['Lights', 'Fans', 'TVs', 'AC', 'Refrigerator', 'Washing Machine']
-            appliance_counts = [lights, fans, tv, ac, fridge, washing_machine]
-            appliance_energy = [
-                lights * 0.2, fans * 0.2, tv * 0.3, 
-                ac * 3.0, fridge * 3.1, washing_machine * 2.8
-            ]
+            appliance_energy = [appliances[appliance] * ENERGY_RATES[appliance] for appliance in APPLIANCES]
             
             # Filter out zero values
             non_zero_indices = [i for i, energy in enumerate(appliance_energy) if energy > 0]
@@ -370,8 +469,8 @@ def show_energy_calculator(collection):
         for tip in tips:
             st.write(f"• {tip}")
         
-        # Save to database
-        if collection is not None:
+        # Queue for the database; the write-behind buffer flushes in batches
+        if write_buffer is not None:
             try:
                 data = {
                     "name": name,
@@ -388,12 +487,64 @@ def show_energy_calculator(collection):
                     "timestamp": datetime.now()
                 }
                 
-                collection.insert_one(data)
-                st.success("✅ Data saved successfully to database!")
+                write_buffer.add(data)
+                if write_buffer.breaker.is_open:
+                    st.warning("💾 Database offline: the record is kept locally and will be saved once the connection is back.")
+                else:
+                    st.success("✅ Data queued for saving to database!")
                 
             except Exception as e:
                 st.error(f"❌ Error saving to database: {e}")
 
+def show_bulk_scoring():
+    st.header("🏘️ Bulk Household Scoring")
+    st.write("Upload a survey CSV with one household per row and a column of appliance counts for: "
+             + ", ".join(f"`{name}`" for name in APPLIANCES)
+             + ". The column names from the Export page are accepted as well.")
+    
+    uploaded_file = st.file_uploader("📤 Survey CSV", type=["csv"])
+    if uploaded_file is None:
+        return
+    
+    try:
+        survey_df = pd.read_csv(uploaded_file)
+        scores = calculate_energy_bulk(survey_df)
+    except Exception as e:
+        st.error(f"❌ Error scoring households: {e}")
+        return
+    
+    results_df = pd.concat([survey_df, scores], axis=1)
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("🏠 Households", len(results_df))
+    
+    with col2:
+        st.metric("📊 Average Energy", f"{scores['energy_kwh_per_day'].mean():.2f} kWh")
+    
+    with col3:
+        st.metric("💰 Total Monthly Cost", f"₹{scores['estimated_monthly_cost'].sum():,.2f}")
+    
+    st.subheader("📊 Results Preview")
+    st.dataframe(results_df.head(100), use_container_width=True)
+    
+    st.download_button(
+        label="📄 Download Scored CSV",
+        data=lambda: results_df.to_csv(index=False),
+        file_name=f"household_scores_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
+# History table paging state: the query anchor and the page number shown
+def reset_history_page():
+    st.session_state.history_anchor = ("first", None)
+    st.session_state.history_page = 1
+
+def go_to_history_page(direction, key, page):
+    st.session_state.history_anchor = (direction, key)
+    st.session_state.history_page = max(1, page)
+
 def show_history(collection):
     st.header("📊 Energy Usage History")
     
@@ -402,18 +553,20 @@ def show_history(collection):
         return
     
     try:
-        # Fetch all records
-        records = list(collection.find().sort("timestamp", -1))
+        # Summary statistics are aggregated from the daily rollups
+        check_query_plan("History summary",
+                         lambda: explain_aggregate(rollup_collection(collection), summary_pipeline()),
+                         full_scan=True)
+        summary = fetch_summary(collection)
         
-        if not records:
+        if not summary:
             st.info("📝 No records found. Add some energy consumption data first!")
             return
         
-        # Display summary statistics
-        total_records = len(records)
-        avg_energy = sum(record.get('energy_kwh_per_day', 0) for record in records) / total_records
-        max_energy = max(record.get('energy_kwh_per_day', 0) for record in records)
-        min_energy = min(record.get('energy_kwh_per_day', 0) for record in records)
+        total_records = summary['total_records']
+        avg_energy = summary['avg_energy']
+        max_energy = summary['max_energy']
+        min_energy = summary['min_energy']
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -429,19 +582,17 @@ def show_history(collection):
         with col4:
             st.metric("🔽 Minimum Energy", f"{min_energy:.2f} kWh")
         
-        # Create and display chart
-        fig = create_energy_chart(records)
-        if fig:
-            st.pyplot(fig)
-            
-            # Option to download chart
-            buf = BytesIO()
-            fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-            buf.seek(0)
+        # Create and display chart from the latest 7 entries
+        check_query_plan("History chart", lambda: explain_find(collection, sort=[("timestamp", -1)], projection=CHART_PROJECTION))
+        points = fetch_recent_points(collection, limit=7)
+        preview = render_energy_chart(points, PREVIEW_DPI)
+        if preview:
+            st.image(preview, use_container_width=True)
             
+            # Option to download chart; the high resolution PNG is rendered on click
             st.download_button(
                 label="📥 Download Chart as PNG",
-                data=buf.getvalue(),
+                data=lambda: render_energy_chart(points, DOWNLOAD_DPI),
                 file_name=f"energy_usage_chart_{datetime.now().strftime('%Y%m%d')}.png",
                 mime="image/png"
             )
@@ -449,6 +600,21 @@ def show_history(collection):
         # Display records table
         st.subheader("📋 All Records")
         
+        # One indexed keyset query per page; never skip()
+        page_size = st.selectbox("Rows per page", [10, 25, 50, 100], index=1,
+                                 key="history_page_size", on_change=reset_history_page)
+        total_pages = max(1, math.ceil(total_records / page_size))
+        if 'history_anchor' not in st.session_state:
+            reset_history_page()
+        
+        direction, key = st.session_state.history_anchor
+        filter, sort = history_page_query(direction, key)
+        check_query_plan("History page", lambda: explain_find(collection, filter, sort, HISTORY_PROJECTION))
+        # The last page holds the remainder so page boundaries match the forward walk
+        page_limit = total_records - (total_pages - 1) * page_size if direction == "last" else page_size
+        records = fetch_history_page(collection, page_limit, direction, key)
+        page = min(st.session_state.history_page, total_pages)
+        
         # Prepare data for display
         display_data = []
         for record in records:
@@ -465,9 +631,51 @@ def show_history(collection):
         df = pd.DataFrame(display_data)
         st.dataframe(df, use_container_width=True)
         
+        # Page controls
+        first_key = history_key(records[0]) if records else None
+        last_key = history_key(records[-1]) if records else None
+        col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
+        
+        with col1:
+            st.button("⏮️ First", on_click=go_to_history_page, args=("first", None, 1),
+                      disabled=page <= 1)
+        
+        with col2:
+            st.button("◀️ Previous", on_click=go_to_history_page, args=("before", first_key, page - 1),
+                      disabled=page <= 1 or first_key is None)
+        
+        with col3:
+            st.markdown(f"<p style='text-align: center;'>Page {page} of {total_pages}</p>", unsafe_allow_html=True)
+        
+        with col4:
+            st.button("Next ▶️", on_click=go_to_history_page, args=("after", last_key, page + 1),
+                      disabled=page >= total_pages or len(records) < page_limit)
+        
+        with col5:
+            st.button("Last ⏭️", on_click=go_to_history_page, args=("last", None, total_pages),
+                      disabled=page >= total_pages)
+        
     except Exception as e:
         st.error(f"❌ Error fetching data: {e}")
 
+# Download builders run only when a download button is clicked
+def build_export_csv(collection):
+    # The open temp file is handed over as it is, not read into bytes here;
+    # Streamlit reads it once for the download and the file goes when collected
+    return write_export_csv(collection)
+
+def build_export_excel(collection):
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Energy Data')
+    sheet.append(EXPORT_HEADER)
+    for row in iter_export_rows(collection):
+        sheet.append(row)
+    excel_buffer = BytesIO()
+    workbook.save(excel_buffer)
+    return excel_buffer.getvalue()
+
 def show_export_data(collection):
     st.header("📁 Export Data")
     
@@ -476,42 +684,22 @@ def show_export_data(collection):
         return
     
     try:
-        records = list(collection.find())
+        check_query_plan("Export statistics",
+                         lambda: explain_aggregate(rollup_collection(collection), export_stats_pipeline()),
+                         full_scan=True)
+        check_query_plan("Export unique users", lambda: explain_aggregate(collection, unique_users_pipeline()))
+        stats = fetch_export_stats(collection)
         
-        if not records:
+        if not stats:
             st.info("📝 No data to export. Add some records first!")
             return
         
-        # Prepare data for export
-        export_data = []
-        for record in records:
-            # Flatten the appliances data
-            appliances = record.get('appliances', {})
-            export_row = {
-                'Name': record.get('name', ''),
-                'Age': record.get('age', ''),
-                'City': record.get('city', ''),
-                'Area': record.get('area', ''),
-                'Date': record.get('date', ''),
-                'Day_of_Week': record.get('day_of_week', ''),
-                'Lights': appliances.get('light', 0),
-                'Fans': appliances.get('fans', 0),
-                'TVs': appliances.get('tv', 0),
-                'Air_Conditioners': appliances.get('ac', 0),
-                'Refrigerators': appliances.get('fridge', 0),
-                'Washing_Machines': appliances.get('washing_machine', 0),
-                'Energy_kWh_per_day': record.get('energy_kwh_per_day', 0),
-                'Daily_Cost_INR': record.get('estimated_daily_cost', 0),
-                'Monthly_Cost_INR': record.get('estimated_monthly_cost', 0),
-                'Yearly_Cost_INR': record.get('estimated_yearly_cost', 0)
-            }
-            export_data.append(export_row)
-        
-        df = pd.DataFrame(export_data)
-        
         # Display preview
         st.subheader("📊 Data Preview")
-        st.dataframe(df.head(10), use_container_width=True)
+        check_query_plan("Export records", lambda: explain_find(collection, projection=EXPORT_PROJECTION),
+                         full_scan=True)
+        preview_df = pd.DataFrame(iter_export_rows(collection, limit=10), columns=EXPORT_HEADER)
+        st.dataframe(preview_df, use_container_width=True)
         
         # Export options
         st.subheader("📥 Export Options")
@@ -519,24 +707,19 @@ def show_export_data(collection):
         col1, col2 = st.columns(2)
         
         with col1:
-            # CSV export
-            csv = df.to_csv(index=False)
+            # CSV export, streamed from the cursor into a temp file
             st.download_button(
                 label="📄 Download as CSV",
-                data=csv,
+                data=lambda: build_export_csv(collection),
                 file_name=f"energy_consumption_data_{datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv"
             )
         
         with col2:
             # Excel export
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Energy Data')
-            
             st.download_button(
                 label="📊 Download as Excel",
-                data=excel_buffer.getvalue(),
+                data=lambda: build_export_excel(collection),
                 file_name=f"energy_consumption_data_{datetime.now().strftime('%Y%m%d')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
@@ -547,16 +730,16 @@ def show_export_data(collection):
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("📊 Total Records", len(df))
-            st.metric("👥 Unique Users", df['Name'].nunique())
+            st.metric("📊 Total Records", stats['total_records'])
+            st.metric("👥 Unique Users", stats['unique_users'])
         
         with col2:
-            st.metric("🏙️ Cities Covered", df['City'].nunique())
-            st.metric("📅 Date Range", f"{df['Date'].min()} to {df['Date'].max()}")
+            st.metric("🏙️ Cities Covered", stats['unique_cities'])
+            st.metric("📅 Date Range", f"{stats['first_date']} to {stats['last_date']}")
         
         with col3:
-            st.metric("⚡ Total Energy", f"{df['Energy_kWh_per_day'].sum():.2f} kWh")
-            st.metric("💰 Total Cost", f"₹{df['Daily_Cost_INR'].sum():.2f}")
+            st.metric("⚡ Total Energy", f"{stats['total_energy']:.2f} kWh")
+            st.metric("💰 Total Cost", f"₹{stats['total_cost']:.2f}")
         
     except Exception as e:
         st.error(f"❌ Error exporting data: {e}")